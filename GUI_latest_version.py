@@ -1,13 +1,30 @@
-import PySimpleGUI as sg
 import serial
-import time
-from datetime import datetime
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from ppg.lazy import preload
+from ppg.pipeline import Pipeline
+from ppg.ring_buffer import RingBuffer
+from ppg.serial_reader import SerialReader
+from ppg.threshold_settings import ThresholdSettings
+from ppg.timestamps import monotonic
+
+LOG_FILE = "ppg_monitor.log"  # Every log entry is also written here (rotated at 5 MB)
 
 # Initialize serial connection (adjust COM port and baud rate)
 ser = serial.Serial('COM5', 115200, timeout=1)  # Replace 'COM5' with your port
 
+# Read the port on a background thread so the GUI never blocks on it
+reader = SerialReader(ser)
+reader.start()
+
+# The GUI toolkit and matplotlib take a while to import, so they are only
+# loaded once the port is already being read in the background
+import PySimpleGUI as sg
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from ppg.gui.alarm_indicator import AlarmIndicator
+from ppg.gui.live_plot import LivePlot
+from ppg.gui.log_panel import LogPanel
+from ppg.gui.render_scheduler import RenderScheduler
+
 # Function to draw the figure on the canvas
 def draw_figure(canvas, figure):
     figure_canvas_agg = FigureCanvasTkAgg(figure, canvas)
@@ -15,6 +32,12 @@ def draw_figure(canvas, figure):
     figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
     return figure_canvas_agg
 
+# Function to show a figure canvas that has already been created
+def show_figure(figure_canvas_agg):
+    figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
+    figure_canvas_agg.draw()
+    return figure_canvas_agg
+
 # Create the initial Matplotlib figures
 def create_plots():
     fig1, ax1 = plt.subplots(figsize=(15, 12))  # PPG signal plot
@@ -27,41 +50,14 @@ def create_plots():
 
     return (fig1, ax1), (fig2, ax2)
 
-# Function to draw the alarm LEDs
-def draw_alarm(canvas, state):
-    canvas.delete("all")
-    colors = {"high": "red", "normal": "green", "low": "blue"}
-    positions = {"high": (50, 50), "normal": (150, 50), "low": (250, 50)}
-    for key, pos in positions.items():
-        color = colors[key] if state == key else "grey"
-        canvas.create_oval(pos[0] - 20, pos[1] - 20, pos[0] + 20, pos[1] + 20, fill=color)
-        canvas.create_text(pos[0], pos[1] + 30, text=key.capitalize(), font=("Helvetica", 12))
-    canvas.create_text(150, 10, text="ALARMS", font=("Helvetica", 16))
-
-# Function to flash the alarm LEDs
-def flash_alarm(canvas, state):
-    colors = {"high": "red", "low": "blue"}
-    positions = {"high": (50, 50), "low": (250, 50)}
-    for key in ["high", "low"]:
-        if state == key:
-            for _ in range(3):  # Flashing three times
-                canvas.create_oval(positions[key][0] - 20, positions[key][1] - 20,
-                                   positions[key][0] + 20, positions[key][1] + 20,
-                                   fill=colors[key])
-                time.sleep(0.5)
-                canvas.create_oval(positions[key][0] - 20, positions[key][1] - 20,
-                                   positions[key][0] + 20, positions[key][1] + 20,
-                                   fill="grey")
-                time.sleep(0.5)
-
 # Layout for the GUI
 layout = [
     [sg.Text("Pulse Rate: "), sg.Text("0", key='-BPM-', font=("Helvetica", 50), size=(10, 1))],
     [sg.Canvas(key='-CANVAS-', size=(1200, 800)),
      sg.Column([
          [sg.Canvas(key='-ALARM-', size=(300, 100))],
-         [sg.Text("High Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(20, 15), default_value=100, key='-HIGH-THRESH-'), sg.InputText('100', size=(5, 1), key='-HIGH-INPUT-')],
-         [sg.Text("Low Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(20, 15), default_value=60, key='-LOW-THRESH-'), sg.InputText('60', size=(5, 1), key='-LOW-INPUT-')],
+         [sg.Text("High Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(20, 15), default_value=100, key='-HIGH-THRESH-', enable_events=True), sg.InputText('100', size=(5, 1), key='-HIGH-INPUT-', enable_events=True)],
+         [sg.Text("Low Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(20, 15), default_value=60, key='-LOW-THRESH-', enable_events=True), sg.InputText('60', size=(5, 1), key='-LOW-INPUT-', enable_events=True)],
          [sg.Button("Info"), sg.Button("PPG signal"), sg.Button("Heart rate (bpm)")]
      ])],
     [sg.Multiline(size=(100, 10), key='-LOG-', disabled=True, font=("Helvetica", 16))],
@@ -71,31 +67,99 @@ layout = [
 # Create the window
 window = sg.Window("PPG Monitor", layout, finalize=True, resizable=True)
 
+# scipy is only needed once samples are filtered, import it while the window is idle
+preload('scipy.signal')
+
+# Packets -> filter -> heart rate -> alarm, the GUI only displays the readings
+pipeline = Pipeline(fs=50)
+
+# Alarm thresholds, loaded from and saved to ppg_settings.json and pushed to the pipeline's alarm engine
+settings = ThresholdSettings("ppg_settings.json")
+settings.subscribe(pipeline.alarm.set_limits)
+settings.bind(window)
+
+# Log entries are batched into the Multiline once per frame, which keeps the last 500 lines
+log_panel = LogPanel(window['-LOG-'], file_path=LOG_FILE)
+
 # Draw the initial plots
 (fig1, ax1), (fig2, ax2) = create_plots()
-canvas = draw_figure(window['-CANVAS-'].TKCanvas, fig1)
+canvas1 = draw_figure(window['-CANVAS-'].TKCanvas, fig1)
+canvas2 = draw_figure(window['-CANVAS-'].TKCanvas, fig2)
+canvas2.get_tk_widget().pack_forget()
+canvas = canvas1
+
+# Create the plot lines once, they are updated in place and blitted
+pulse_plot = LivePlot(canvas1, ax1)
+pulse_plot.add_line("raw", label="Pulse Waveform")
+pulse_plot.add_hline("threshold", color='r', linestyle='--', label="Threshold")
+pulse_plot.legend()
+
+hr_plot = LivePlot(canvas2, ax2, xmargin=0.5)
+hr_plot.add_line("heart_rate", label="Heart Rate")
+hr_plot.legend()
+
+# Redraw functions for the plot views, called by the render scheduler
+def redraw_pulse():
+    pulse_plot.set_data("raw", pulse_data.latest())
+    if adp_threshold is not None:
+        pulse_plot.set_hline("threshold", adp_threshold)
+    pulse_plot.update()
+
+def redraw_heart_rate():
+    hr_plot.set_data("heart_rate", heart_rate_data.latest(), x=time_data.latest())
+    hr_plot.update()
+
+# Packets only mark views dirty, the visible view is redrawn at most once per frame
+renderer = RenderScheduler(fps=20)
+renderer.add_view("pulse", redraw_pulse)
+renderer.add_view("heart_rate", redraw_heart_rate)
+renderer.show("pulse")
 
 # Draw the initial alarm state
-alarm_canvas = window['-ALARM-'].TKCanvas
-draw_alarm(alarm_canvas, "normal")
+alarm = AlarmIndicator(window['-ALARM-'].TKCanvas)
 
-pulse_data = []
-heart_rate_data = []
-time_data = []
+# Fixed-size sample buffers (pulse: last 250 samples, heart rate: last 10 readings)
+pulse_data = RingBuffer(250)
+heart_rate_data = RingBuffer(10)
+time_data = RingBuffer(10)
 t = 0
 
-# Set update frequency to 1 second
-last_update_time = time.time()
-last_packet_time = time.time()
+last_packet_time = monotonic()
+last_log_time = monotonic()
+
+# Device threshold of the last packet (the single-line format has none)
+adp_threshold = None
+
+# Handle one Reading from the pipeline
+def on_reading(reading):
+    global t, adp_threshold
+    pulse_data.extend(reading.samples)
+    if reading.threshold is not None:
+        adp_threshold = reading.threshold
+
+    # Plot the pulse data on the next frame
+    renderer.mark_dirty("pulse")
 
-# Initialize variables for adaptive threshold calculation
-alpha = 0.1
-emaValue = 1900
-adp_threshold = emaValue + 20
+    # Update heart rate
+    if reading.heart_rate is not None:
+        heart_rate_data.append(reading.heart_rate)
+        window['-BPM-'].update(f"{reading.heart_rate:.1f} BPM")
+
+        # Add time point for graph
+        time_data.append(t)
+        t += 1
+
+        # Plot heart rate data on the next frame
+        renderer.mark_dirty("heart_rate")
+
+    # Log only when the alarm state changes
+    if reading.alarm is not None:
+        alarm.set_state(reading.alarm)
+        log_panel.log(f"Pulse {reading.alarm.capitalize()}")
 
 # Main loop
 while True:
-    event, values = window.read(timeout=100)
+    event, values = window.read(timeout=renderer.timeout_ms())
 
     if event == sg.WIN_CLOSED or event == 'Exit':
         break
@@ -103,104 +167,42 @@ while True:
     # Handle graph switching buttons
     if event == 'PPG signal':
         canvas.get_tk_widget().pack_forget()
-        canvas = draw_figure(window['-CANVAS-'].TKCanvas, fig1)
-        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Display PPG signal")
+        canvas = show_figure(canvas1)
+        renderer.show("pulse")
+        log_panel.log("Display PPG signal")
     elif event == 'Heart rate (bpm)':
         canvas.get_tk_widget().pack_forget()
-        canvas = draw_figure(window['-CANVAS-'].TKCanvas, fig2)
-        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Display heart rate (bpm)")
+        canvas = show_figure(canvas2)
+        renderer.show("heart_rate")
+        log_panel.log("Display heart rate (bpm)")
     elif event == 'Info':
         canvas.get_tk_widget().pack_forget()
+        renderer.show()
         window['-CANVAS-'].TKCanvas.create_rectangle(0, 0, window['-CANVAS-'].TKCanvas.winfo_width(), window['-CANVAS-'].TKCanvas.winfo_height(), fill="white")
-        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Display Info")
-
-    # Update threshold values from input fields and handle empty input gracefully
-    try:
-        high_threshold = int(values['-HIGH-INPUT-']) if values['-HIGH-INPUT-'] else int(values['-HIGH-THRESH-'])
-        low_threshold = int(values['-LOW-INPUT-']) if values['-LOW-INPUT-'] else int(values['-LOW-THRESH-'])
-        window['-HIGH-THRESH-'].update(high_threshold)
-        window['-LOW-THRESH-'].update(low_threshold)
-    except ValueError:
-        pass
-
-    # Read data from serial
-    if ser.in_waiting > 0:
-        line = ser.readline().decode('utf-8').strip()  # Read serial data
-        last_packet_time = time.time()  # Update last packet time
-        
-        # Process the received line
-        if line:
-            try:
-                # Split the line by commas and strip any extra spaces
-                data = [x.strip() for x in line.split(",")]
-                heart_rate = float(data[0])  # First value is heart rate
-                pulse_values = list(map(int, data[1:]))  # Remaining values are pulse signal
-
-                # Update heart rate
-                heart_rate_data.append(heart_rate)
-                window['-BPM-'].update(f"{heart_rate:.1f} BPM")
-
-                # Add time point for graph
-                time_data.append(t)
-                t += 1
-
-                # Update raw pulse data
-                pulse_data.extend(pulse_values)
-                if len(pulse_data) > 250:  # Limit the size of data to avoid memory overload
-                    pulse_data = pulse_data[-250:]
-                    time_data = time_data[-250:]
-
-                # Manage x-axis sliding window for both plots
-                if len(time_data) > 10:
-                    time_data = time_data[-10:]  # Keep last 10 seconds of data
-                    heart_rate_data = heart_rate_data[-10:]  # Same for heart rate
-
-                # Determine pulse status and log it in the required format
-                timestamp = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
-                if heart_rate > high_threshold:
-                    log_message = f"{timestamp}: Pulse High"
-                    draw_alarm(alarm_canvas, "high")
-                elif heart_rate < low_threshold:
-                    log_message = f"{timestamp}: Pulse Low"
-                    draw_alarm(alarm_canvas, "low")
-                else:
-                    log_message = f"{timestamp}:Pulse Normal"
-                    draw_alarm(alarm_canvas, "normal")
-                
-                window['-LOG-'].print(log_message)
-
-                # Calculate adaptive threshold
-                emaValue = (alpha * pulse_values[-1]) + ((1 - alpha) * emaValue)
-                adp_threshold = emaValue + 20
-
-                # Refresh the plot every second
-                if time.time() - last_update_time >= 1:
-                    last_update_time = time.time()
-
-                    # Clear and update both plots
-                    ax1.clear()
-                    ax1.plot(pulse_data, label="Pulse Waveform")
-                    ax1.axhline(y=adp_threshold, color='r', linestyle='--', label="Threshold")  # Add threshold line
-                    ax1.set_xlabel("Sample Points")
-                    ax1.set_ylabel("Pulse Data")
-                    ax1.legend()
-
-                    ax2.clear()
-                    ax2.plot(time_data, heart_rate_data, label="Heart Rate")
-                    ax2.set_xlim([min(time_data), max(time_data)])  # Keep last 10 seconds range
-                    ax2.set_ylim([min(heart_rate_data) - 5, max(heart_rate_data) + 5])  # Adjust Y range dynamically
-                    ax2.set_xlabel("Time (s)")
-                    ax2.set_ylabel("Heart Rate (BPM)")
-                    ax2.legend()
-
-                    canvas.draw()
-
-            except Exception as e:
-                # Hide error messages from the data log
-                pass
+        log_panel.log("Display Info")
 
-    # Check for packet arrival alarm
-    if time.time() - last_packet_time > 5:
-        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Packet not received for 5 seconds!")
+    # Threshold sliders and input boxes (validated and saved)
+    settings.handle(event, values)
+
+    # Packets received since the last frame, as Readings from the pipeline
+    lines = reader.drain()
+    for reading in pipeline.process_items(lines):
+        on_reading(reading)
+    if lines:
+        last_packet_time = lines[-1][0]  # Arrival time of the last packet
 
+    # Check for packet arrival alarm
+    if not lines and monotonic() - last_packet_time > 5:
+        if monotonic() - last_log_time > 1:  # Only log once per second
+            log_panel.warning("Packet not received for 5 seconds!")
+            last_log_time = monotonic()
+
+    # Redraw the visible plot if it changed and a frame is due
+    renderer.tick()
+    log_panel.flush()
+
+log_panel.close()
+alarm.close()
+reader.stop()
 ser.close()
+settings.close()
@@ -1,30 +1,41 @@
-import PySimpleGUI as sg
 import time
 import threading
+import queue
 import serial
 import serial.tools.list_ports
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import numpy as np
+from ppg.device_simulator import DeviceSimulator
+from ppg.lazy import preload
+from ppg.pipeline import Pipeline
+from ppg.ring_buffer import RingBuffer
+from ppg.serial_reader import SerialReader
+from ppg.session_recorder import ReplayPort, SessionRecorder
+from ppg.timestamps import monotonic
 
 # Bluetooth settings
 BAUD_RATE = 115200
 RECONNECT_DELAY = 2  # Retry connection every 2 seconds
+RECORD_FILE = None  # Record every packet to this file, e.g. "session.ppgrec"
+REPLAY_FILE = None  # Replay a recording instead of connecting to the device
+REPLAY_SPEED = 1.0  # 1.0 = real time, N = N times faster, None = as fast as possible
+LOG_FILE = "pulse_monitor.log"  # Every log entry is also written here (rotated at 5 MB)
+SIMULATE_DEVICE = False  # Run against device_simulator (binary frames) instead of the board
 
 # Global variables for data tracking
-bpm_trend = []  # List to store BPM data over time
-pulse_waveform = []  # Store pulse waveform data (sensor values)
-x_axis = []  # X-axis to represent sample count or time
-last_packet_time = time.time()  # Track time for packet loss detection
+bpm_trend = RingBuffer(60)  # Last 60 seconds of BPM data
+pulse_waveform = RingBuffer(50)  # Latest packet of pulse waveform data (sensor values)
+latest_threshold = None  # Latest adaptive threshold from the ESP32
+alarm_overridden = False  # True while '-ALARM-' shows a status message instead of the alarm state
+last_packet_time = monotonic()  # Track time for packet loss detection
+last_loss_log_time = 0  # Time the packet loss alarm was last logged
+incomplete_packets = 0  # Incomplete packets already reported
 connected = False
 reconnect_thread_running = False
 ser = None  # Serial connection object
-
-# Function to create a matplotlib figure for embedding
-def draw_figure(canvas, figure):
-    figure_canvas_agg = FigureCanvasTkAgg(figure, canvas)
-    figure_canvas_agg.draw()
-    figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
-    return figure_canvas_agg
+connection_log = queue.SimpleQueue()  # (time, message) from the connection thread, shown by the GUI loop
+reader = None  # Background thread reading the serial connection
+recorder = SessionRecorder(RECORD_FILE) if RECORD_FILE else None
+pipeline = Pipeline(fs=50, recorder=recorder)  # Filter, host BPM estimate and alarm engine, records every packet
 
 # Function to check if any serial port is available and return the available port
 def get_available_port():
@@ -37,66 +48,75 @@ def get_available_port():
 # Function to handle Bluetooth connection and reconnection
 def bluetooth_connect():
     global connected, ser, reconnect_thread_running
-    start_time = time.time()
+    start_time = monotonic()
 
     while not connected:
         try:
             # Scan for available ports
             port = get_available_port()
             if not port:
-                window.write_event_value('-LOG-', "No available ports. Waiting for device...")
+                connection_log.put((time.time(), "No available ports. Waiting for device..."))
                 time.sleep(RECONNECT_DELAY)
                 continue
 
             # Attempt to connect
             ser = serial.Serial(port, BAUD_RATE, timeout=1)
-            window.write_event_value('-LOG-', f"Connected to {port}")
+            connection_log.put((time.time(), f"Connected to {port}"))
             connected = True
         except serial.SerialException as e:
             # Reattempt connection every RECONNECT_DELAY until timeout is reached
-            window.write_event_value('-LOG-', f"Connection failed: {e}. Retrying in {RECONNECT_DELAY} seconds...")
+            connection_log.put((time.time(), f"Connection failed: {e}. Retrying in {RECONNECT_DELAY} seconds..."))
             time.sleep(RECONNECT_DELAY)
             # Check if we've exceeded the maximum connection timeout
-            if time.time() - start_time > CONNECTION_TIMEOUT:
-                window.write_event_value('-LOG-', "Failed to reconnect within 10 seconds. Continuing attempts...")
-                start_time = time.time()  # Reset the timer to continue trying
+            if monotonic() - start_time > CONNECTION_TIMEOUT:
+                connection_log.put((time.time(), "Failed to reconnect within 10 seconds. Continuing attempts..."))
+                start_time = monotonic()  # Reset the timer to continue trying
 
     reconnect_thread_running = False  # Set flag to false once connected
     return ser
 
 # Function to read data from the ESP32 via Bluetooth
 def read_from_esp():
-    global last_packet_time, connected, reconnect_thread_running, ser
-    buffer = []  # Buffer to store multi-line data
-    ser = bluetooth_connect()
+    global connected, ser, reader
 
     while True:
-        try:
-            if ser.is_open and ser.in_waiting > 0:
-                data = ser.readline().decode('utf-8').strip()
-                if data:
-                    buffer.append(data)
+        if REPLAY_FILE:
+            ser = ReplayPort(REPLAY_FILE, speed=REPLAY_SPEED)
+            connected = True
+        elif SIMULATE_DEVICE:
+            ser = DeviceSimulator(binary=True).open_loop()
+            connected = True
+        else:
+            ser = bluetooth_connect()
 
-                # Expecting 3 lines of data: raw pulse data, BPM, and adaptive threshold
-                if len(buffer) == 3:
-                    window.write_event_value('-DATA-', buffer.copy())
-                    last_packet_time = time.time()  # Update packet arrival time
-                    buffer.clear()
+        # The reader drains the port into a bounded queue and exits when the port fails
+        # (unbounded when replaying at full speed so no packet is dropped)
+        reader = SerialReader(ser, maxsize=0 if REPLAY_FILE and not REPLAY_SPEED else 1000)
+        reader.start()
+        reader.join()
 
-        except serial.SerialException as e:
-            window.write_event_value('-LOG-', f"Connection lost: {e}. Trying to reconnect...")
-            connected = False
-            if ser:
-                ser.close()  # Close the serial connection on failure
-            if not reconnect_thread_running:
-                threading.Thread(target=bluetooth_connect, daemon=True).start()
-                reconnect_thread_running = True
-
-        except KeyboardInterrupt:
-            window.write_event_value('-LOG-', "Exiting...")
-            if connected and ser:
-                ser.close()
-            break
+        connection_log.put((time.time(), f"Connection lost: {reader.error}. Trying to reconnect..."))
+        connected = False
+        ser.close()  # Close the serial connection on failure
+
+# Start thread to read data from ESP32 via Bluetooth
+threading.Thread(target=read_from_esp, daemon=True).start()
+
+# The GUI toolkit and matplotlib take a while to import, so they are only
+# loaded once the port is already being read in the background
+import PySimpleGUI as sg
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from ppg.gui.live_plot import LivePlot
+from ppg.gui.log_panel import LogPanel
+from ppg.gui.render_scheduler import RenderScheduler
+
+# Function to create a matplotlib figure for embedding
+def draw_figure(canvas, figure):
+    figure_canvas_agg = FigureCanvasTkAgg(figure, canvas)
+    figure_canvas_agg.draw()
+    figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
+    return figure_canvas_agg
 
 # GUI layout
 layout = [
@@ -115,6 +135,12 @@ layout = [
 # Create the window
 window = sg.Window('Pulse Monitor', layout, finalize=True, resizable=True)  # Make the window resizable
 
+# scipy is only needed once samples are filtered, import it while the window is idle
+preload('scipy.signal')
+
+# Log entries are batched into the Multiline once per frame, which keeps the last 500 lines
+log_panel = LogPanel(window['-LOG-'], file_path=LOG_FILE)
+
 # Create matplotlib figures for pulse waveform and BPM trend
 fig1, ax1 = plt.subplots(figsize=(6, 4))  # Larger figure size
 ax1.set_title("Pulse Waveform with Adaptive Threshold", fontsize=16)
@@ -126,104 +152,130 @@ ax2.set_title("BPM Trend Analysis", fontsize=16)
 ax2.set_ylabel("BPM", fontsize=12)
 ax2.set_xlabel("Time (seconds)", fontsize=12)
 
+# Adjust the layouts once, not on every update
+fig1.tight_layout()
+fig2.tight_layout()
+
 # Embed the figures in PySimpleGUI
 fig_canvas_agg1 = draw_figure(window['-CANVAS1-'].TKCanvas, fig1)
 fig_canvas_agg2 = draw_figure(window['-CANVAS2-'].TKCanvas, fig2)
 
-# Start thread to read data from ESP32 via Bluetooth
-threading.Thread(target=read_from_esp, daemon=True).start()
+# Create the plot lines once, they are updated in place and blitted
+pulse_plot = LivePlot(fig_canvas_agg1, ax1)
+pulse_plot.add_line("waveform", label="Pulse Waveform")
+pulse_plot.add_hline("threshold", color='red', linestyle='--', label="Adaptive Threshold")
+pulse_plot.legend(fontsize=10)
+
+bpm_plot = LivePlot(fig_canvas_agg2, ax2)
+bpm_plot.add_line("bpm", label="BPM Trend")
+bpm_plot.legend(fontsize=10)
+
+# Redraw functions for the plots, called by the render scheduler
+def redraw_pulse():
+    # Update the pulse waveform plot and the adaptive threshold line
+    waveform = pulse_waveform.latest()
+    x_axis = np.arange(len(waveform)) * 0.02  # Time-based x-axis (20ms intervals)
+    pulse_plot.set_data("waveform", waveform, x=x_axis)
+    if latest_threshold is not None:
+        pulse_plot.set_hline("threshold", latest_threshold)
+    pulse_plot.update()
+
+def redraw_bpm():
+    # Update BPM trend plot
+    bpm_plot.set_data("bpm", bpm_trend.latest())
+    bpm_plot.update()
+
+# Data sets only mark plots dirty, each plot is redrawn at most once per frame
+renderer = RenderScheduler(fps=20)
+renderer.add_view("pulse", redraw_pulse)
+renderer.add_view("bpm", redraw_bpm)
+renderer.show("pulse", "bpm")
+
+# Text and colour shown in '-ALARM-' for each alarm state
+ALARM_TEXT = {
+    "high": ("Alarm: BPM Too High!", 'red'),
+    "low": ("Alarm: BPM Too Low!", 'red'),
+    "normal": ("BPM Normal", 'green'),
+}
+
+# Function to show a status message in place of the alarm state
+def show_status(message, color):
+    global alarm_overridden
+    window['-ALARM-'].update(message, text_color=color)
+    alarm_overridden = True
 
 # Function to update the GUI with real-time data
-def update_gui(pulse_values, bpm, adp_threshold):
-    global bpm_trend, pulse_waveform, x_axis
+def update_gui(reading):
+    global latest_threshold, alarm_overridden, last_packet_time
+    last_packet_time = reading.time
+
+    # The pipeline's BPM is the host estimate once it has enough samples, else the ESP32's
+    bpm = reading.heart_rate if reading.heart_rate is not None else reading.device_heart_rate
+    if bpm is None:
+        bpm = 0.0
 
     # Update BPM text display
     window['-BPM-'].update(f'{bpm:.1f}')
 
-    # Generate X-axis values (either sample count or time in seconds)
-    if not x_axis:
-        x_axis = [i * 0.02 for i in range(len(pulse_values))]  # Time-based x-axis (20ms intervals)
-    else:
-        x_axis = x_axis[-len(pulse_values):]  # Ensure x_axis matches pulse_values length
-
-    # Update the pulse waveform plot and add the adaptive threshold line
-    pulse_waveform = pulse_values
-    ax1.clear()
-    ax1.plot(x_axis, pulse_waveform, label="Pulse Waveform")
-    ax1.axhline(y=adp_threshold, color='red', linestyle='--', label="Adaptive Threshold")
-    ax1.set_title("Pulse Waveform with Adaptive Threshold", fontsize=16)
-    ax1.set_ylabel("Sensor Value", fontsize=12)
-    ax1.set_xlabel("Time (seconds)", fontsize=12)
-    ax1.legend(fontsize=10)  # Add a legend
-    fig1.tight_layout()  # Adjust layout to prevent overlap
-    fig_canvas_agg1.draw()
-
-    # Update BPM trend plot
+    # Store the new data, both plots are redrawn on the next frame
+    pulse_waveform.extend(reading.samples)
+    latest_threshold = reading.threshold
+    renderer.mark_dirty("pulse")
     bpm_trend.append(bpm)
-    if len(bpm_trend) > 60:  # Keep last 60 seconds of data
-        bpm_trend.pop(0)
-    ax2.clear()
-    ax2.plot(bpm_trend, label="BPM Trend")
-    ax2.set_title("BPM Trend Analysis", fontsize=16)
-    ax2.set_ylabel("BPM", fontsize=12)
-    ax2.set_xlabel("Time (seconds)", fontsize=12)
-    ax2.legend(fontsize=10)  # Add a legend
-    fig2.tight_layout()  # Adjust layout to prevent overlap
-    fig_canvas_agg2.draw()
+    renderer.mark_dirty("bpm")
 
     # Log event
-    window['-LOG-'].print(f"{time.strftime('%a %b %d %H:%M:%S %Y')}: New Data Received, BPM: {bpm:.1f}")
-
-    # Check for high/low BPM and display alarm
-    if bpm < 60 or bpm > 100:  # Define thresholds
-        window['-ALARM-'].update("Alarm: BPM Out of Range!", text_color='red')
-    else:
-        window['-ALARM-'].update("BPM Normal", text_color='green')
+    log_panel.log(f"New Data Received, BPM: {bpm:.1f}")
+
+    # Redraw the alarm only when its state changes (or a status message replaced it),
+    # readings the spectrum does not confirm cannot raise or clear it
+    state = reading.alarm
+    if state is not None:
+        log_panel.log(f"Alarm state: {state}")
+    if state is not None or alarm_overridden:
+        text, color = ALARM_TEXT[pipeline.alarm.state]
+        window['-ALARM-'].update(text, text_color=color)
+        alarm_overridden = False
 
 # Event loop for the GUI with enhanced error handling
 while True:
     try:
-        event, values = window.read(timeout=1000)  # Update every second
+        event, values = window.read(timeout=renderer.timeout_ms())
         if event == sg.WIN_CLOSED or event == 'Exit':
             break
 
-        # Process incoming data from the ESP32
-        if event == '-DATA-':
-            data = values[event]
-            if len(data) == 3:
-                try:
-                    # Clean sensor values string (removing stray characters)
-                    sensor_values_str = data[0].replace("'", "").replace('"', '').strip()
-                    sensor_values_list = sensor_values_str.split(',')
+        # The pipeline assembles the lines received since the last tick into packets,
+        # resynchronizing on every packet start, so a lost line only costs one packet
+        if reader is not None:
+            for reading in pipeline.process_items(reader.drain()):
+                update_gui(reading)
 
-                    # Ensure we only process valid numeric strings
-                    sensor_values = [float(v.strip()) for v in sensor_values_list if v.strip().replace('.', '', 1).isdigit()]
+        # Report packets dropped because a line was lost or garbled
+        if pipeline.stream.incomplete != incomplete_packets:
+            log_panel.warning(f"Dropped {pipeline.stream.incomplete - incomplete_packets} incomplete packets")
+            show_status("Error processing data", 'red')
+            incomplete_packets = pipeline.stream.incomplete
 
-                    bpm_str = data[1].strip()
-                    adp_threshold_str = data[2].strip()
-
-                    # Convert BPM and adaptive threshold
-                    bpm = float(bpm_str)
-                    adp_threshold = float(adp_threshold_str)
-
-                    # Update the GUI
-                    update_gui(sensor_values, bpm, adp_threshold)
-
-                except ValueError as e:
-                    window['-LOG-'].print(f"Error processing data: {e}")
-                    window['-ALARM-'].update("Error processing data", text_color='red')
-
-        # Check for packet loss
-        if time.time() - last_packet_time > 5:
-            window['-ALARM-'].update("Alarm: No Packet Received for 5 Seconds! Attempting to reconnect...", text_color='orange')
-            window['-LOG-'].print("Alarm: No Packet Received for 5 Seconds! Attempting to reconnect...")
+        # Check for packet loss (logged at most once per second)
+        if monotonic() - last_packet_time > 5 and monotonic() - last_loss_log_time > 1:
+            show_status("Alarm: No Packet Received for 5 Seconds! Attempting to reconnect...", 'orange')
+            log_panel.warning("Alarm: No Packet Received for 5 Seconds! Attempting to reconnect...")
+            last_loss_log_time = monotonic()
 
         # Display connection and reconnection logs in the log window
-        if event == '-LOG-':
-            window['-LOG-'].print(values[event])
+        while not connection_log.empty():
+            when, message = connection_log.get()
+            log_panel.log(message, when=when)
+
+        # Redraw the plots that changed if a frame is due
+        renderer.tick()
+        log_panel.flush()
 
     except Exception as e:
         print(f"Error in event loop: {e}")
-        window['-LOG-'].print(f"Error: {e}")
+        log_panel.warning(f"Error: {e}")
 
+if recorder is not None:
+    recorder.close()
+log_panel.close()
 window.close()
@@ -0,0 +1,137 @@
+import PySimpleGUI as sg
+import argparse
+import math
+import numpy as np
+import serial
+from ppg.device_simulator import DeviceSimulator
+from ppg.multi_reader import DeviceState, MultiDeviceReader, available_ports
+from ppg.gui.render_scheduler import RenderScheduler
+from ppg.lazy import preload
+from ppg.timestamps import monotonic
+
+# Dashboard for several PPG devices at once
+#
+#   python multi_device_gui.py COM5 COM6 COM7   (default: every serial port found)
+#   python multi_device_gui.py --simulate 24    (simulated devices, see device_simulator.py)
+#
+# All ports are read by one MultiDeviceReader thread. Every device gets a
+# tile with its BPM and a mini waveform of the last 5 seconds.
+parser = argparse.ArgumentParser(description="PPG multi-device dashboard")
+parser.add_argument('ports', nargs='*', help="serial ports to open")
+parser.add_argument('--baud', type=int, default=115200)
+parser.add_argument('--simulate', type=int, default=0, help="number of simulated devices")
+parser.add_argument('--speed', type=float, default=1.0, help="simulator speed (packets per second)")
+args = parser.parse_args()
+
+TILE_WIDTH, TILE_HEIGHT = 220, 70  # Mini waveform size in pixels
+STALE_AFTER = 5  # Seconds without a packet before a tile shows "No signal"
+ALARM_COLORS = {"high": "red", "normal": "black", "low": "blue"}  # BPM text colour per alarm state
+
+# Open the ports
+ports = {}
+if args.simulate:
+    for i in range(args.simulate):
+        ports[f"Sim {i + 1}"] = DeviceSimulator(speed=args.speed, seed=i).open_loop(timeout=0)
+else:
+    for port in args.ports or available_ports():
+        try:
+            ports[port] = serial.Serial(port, args.baud, timeout=0)
+        except serial.SerialException as e:
+            print(f"Could not open {port}: {e}")
+if not ports:
+    sg.popup_error("No devices found.")
+    raise SystemExit(1)
+
+devices = {name: DeviceState(name) for name in ports}
+
+# One tile per device, laid out in a roughly square grid
+def make_tile(name):
+    return sg.Frame(name, [
+        [sg.Text("--- BPM", key=(name, 'bpm'), font=('Helvetica', 16), size=(12, 1)),
+         sg.Text("", key=(name, 'seq'), size=(16, 1))],
+        [sg.Graph((TILE_WIDTH, TILE_HEIGHT), (0, TILE_HEIGHT), (TILE_WIDTH, 0),
+                  key=(name, 'wave'), background_color='white')],
+    ])
+
+names = list(devices)
+columns = math.ceil(math.sqrt(len(names)))
+grid = [[make_tile(name) for name in names[row:row + columns]] for row in range(0, len(names), columns)]
+scroll = len(names) > 16  # Dozens of tiles do not fit on screen
+layout = [
+    [sg.Column(grid, scrollable=scroll, vertical_scroll_only=True, size=(None, 800 if scroll else None))],
+    [sg.Text("", key='-STATUS-'), sg.Push(), sg.Button('Exit')],
+]
+window = sg.Window("PPG Dashboard", layout, finalize=True, resizable=True)
+
+# scipy is only needed once samples are filtered, import it while the window is idle
+preload('scipy.signal')
+
+# One polyline per tile, only its coordinates change on a redraw
+wave_lines = {}
+for name in names:
+    graph = window[(name, 'wave')]
+    wave_lines[name] = graph.TKCanvas.create_line(0, 0, 1, 1, fill='red')
+
+# Function to redraw one tile
+def redraw_tile(name):
+    device = devices[name]
+    if device.heart_rate is not None:
+        window[(name, 'bpm')].update(f"{device.heart_rate:.0f} BPM", text_color=ALARM_COLORS[device.alarm.state])
+    loss = device.sequence.loss_rate()
+    window[(name, 'seq')].update(f"loss {loss:.0%}" if loss else "", text_color='red' if loss > 0.05 else 'black')
+
+    y = device.samples.latest()
+    if len(y) < 2:
+        return
+    low, high = y.min(), y.max()
+    span = (high - low) or 1
+    xs = np.linspace(0, TILE_WIDTH, len(y))
+    ys = (TILE_HEIGHT - 4) - (y - low) / span * (TILE_HEIGHT - 8)
+    window[(name, 'wave')].TKCanvas.coords(wave_lines[name], *np.column_stack((xs, ys)).ravel())
+
+# Only tiles that received data are redrawn, at most 10 times a second
+renderer = RenderScheduler(fps=10)
+for name in names:
+    renderer.add_view(name, lambda name=name: redraw_tile(name))
+renderer.show(*names)
+
+reader = MultiDeviceReader(ports)
+reader.start()
+tile_status = {name: None for name in names}  # None, "No signal" or "Port error"
+
+# Main loop
+while True:
+    event, values = window.read(timeout=renderer.timeout_ms())
+    if event == sg.WIN_CLOSED or event == 'Exit':
+        break
+
+    for arrival_time, name, frame in reader.drain():
+        devices[name].update(arrival_time, frame)
+        renderer.mark_dirty(name)
+
+    # Flag devices that stopped sending, the text only changes on a transition
+    now = monotonic()
+    for name, device in devices.items():
+        if name in reader.errors:
+            status = "Port error"
+        elif device.last_packet_time is None or now - device.last_packet_time > STALE_AFTER:
+            status = "No signal"
+        else:
+            status = None
+        if status != tile_status[name]:
+            tile_status[name] = status
+            if status is None:
+                renderer.mark_dirty(name)  # Back to showing the BPM
+            else:
+                window[(name, 'bpm')].update(status, text_color='red' if name in reader.errors else 'orange')
+
+    renderer.tick()
+    window['-STATUS-'].update(f"{len(devices)} devices, {sum(d.packets for d in devices.values())} packets, "
+                              f"{reader.dropped} dropped")
+
+# Close the ports and the GUI on exit
+reader.stop()
+reader.join()
+for ser in ports.values():
+    ser.close()
+window.close()
@@ -49,6 +49,16 @@ float emaValue = 1900;
 float heart_rate;
 static int order = 1;
 
+// Set to 1 to send compact binary frames (see binary_protocol.py) instead of
+// the R,/H,/T,/S, text lines. The host detects either format by itself.
+#define BINARY_PROTOCOL 0
+#define SAMPLES_PER_PACKET 50
+#define FRAME_SYNC_1 0xA5
+#define FRAME_SYNC_2 0x5A
+
+uint16_t raw_samples[SAMPLES_PER_PACKET];
+uint8_t frame[2 + 2 + 1 + 2 * SAMPLES_PER_PACKET + 2 + 2 + 2];
+
 unsigned long lastDebounceTime = 0;
 int lastSwitchState = LOW;
 int switchState = LOW;
@@ -101,6 +111,55 @@ void setup() {
     Serial.println(btName);
   }
 }
+
+uint16_t crc16(const uint8_t *data, size_t len)
+/*
+** CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF). Matches
+** binascii.crc_hqx(data, 0xFFFF) on the host.
+*/
+{
+  uint16_t crc = 0xFFFF;
+  for (size_t n = 0; n < len; n++) {
+    crc ^= (uint16_t)data[n] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void putU16(uint8_t *p, uint16_t value)
+// Store a little endian uint16
+{
+  p[0] = value & 0xFF;
+  p[1] = value >> 8;
+}
+
+void sendBinaryFrame(uint16_t seq, const uint16_t *samples, uint8_t count, float hr, int threshold)
+/*
+** Sends sync, sequence, sample count, samples, heart rate (tenths of a
+** BPM), threshold and CRC in one write. Layout is documented in
+** binary_protocol.py.
+*/
+{
+  size_t n = 0;
+  float hr_tenths = hr * 10.0f;
+  if (!(hr_tenths >= 0.0f)) hr_tenths = 0.0f;    // Also catches NaN
+  if (hr_tenths > 65535.0f) hr_tenths = 65535.0f;  // and inf before the first beat
+
+  frame[n++] = FRAME_SYNC_1;
+  frame[n++] = FRAME_SYNC_2;
+  putU16(frame + n, seq); n += 2;
+  frame[n++] = count;
+  for (uint8_t k = 0; k < count; k++) {
+    putU16(frame + n, samples[k]); n += 2;
+  }
+  putU16(frame + n, (uint16_t)(hr_tenths + 0.5f)); n += 2;
+  putU16(frame + n, (uint16_t)threshold); n += 2;
+  putU16(frame + n, crc16(frame + 2, n - 2)); n += 2;
+  SerialBT.write(frame, n);
+}
+
 char buf[128];
 unsigned char i;
 char j = '0';
@@ -114,6 +173,7 @@ void loop() {
 
     sensor_reading = analogRead(SENSOR_PIN);
     sprintf(raw_pulse_data + buffer_indicator*5, "%4d,", sensor_reading);
+    if (buffer_indicator < SAMPLES_PER_PACKET) raw_samples[buffer_indicator] = sensor_reading;
     emaValue = (alpha * sensor_reading) + ((1 - alpha) * emaValue);
     adp_threshold = emaValue + 45;
     current_state = (sensor_reading > adp_threshold);
@@ -141,6 +201,7 @@ void loop() {
 
     sensor_reading = analogRead(SENSOR_PIN);
     sprintf(raw_pulse_data + buffer_indicator*5, "%4d,", sensor_reading);
+    if (buffer_indicator < SAMPLES_PER_PACKET) raw_samples[buffer_indicator] = sensor_reading;
     emaValue = (alpha * sensor_reading) + ((1 - alpha) * emaValue);
     adp_threshold = emaValue + 45;
     current_state = (sensor_reading > adp_threshold);
@@ -164,11 +225,15 @@ void loop() {
       buffer_indicator = 0;
     }
     tick_1_sec = 0;
+#if BINARY_PROTOCOL
+    sendBinaryFrame(order, raw_samples, SAMPLES_PER_PACKET, heart_rate, adp_threshold);
+#else
     sprintf(raw_pulse_data + 249, "\n");
     SerialBT.printf("R,%s\n", raw_pulse_data);
     SerialBT.printf("H,%f\n", heart_rate);
     SerialBT.printf("T,%d\n", adp_threshold);
     SerialBT.printf("S,%d\n", order);
+#endif
     order++;
   }
 }
@@ -0,0 +1,64 @@
+import importlib
+
+# Headless PPG processing core
+#
+# Everything needed to read, record, replay, simulate and analyse the
+# pulse sensor without a GUI: importing ppg never opens a port or a window
+# and never loads Tk or matplotlib. The GUI scripts are thin consumers of
+# Pipeline; their drawing helpers live in ppg.gui.
+#
+# The names below are imported from their modules on first use, so
+# `from ppg.serial_reader import SerialReader` (or `import ppg`) does not
+# pay for the rest of the package.
+#
+#   python -m ppg.pipeline            full pipeline throughput
+#   python -m ppg.device_simulator    simulated device on a pseudo terminal
+#   python -m ppg.startup             import time breakdown
+#   python -m ppg.batch_analysis DIR  filter, HR and quality summary of recorded sessions
+_EXPORTS = {
+    'AlarmEngine': 'alarm_engine',
+    'Frame': 'binary_protocol',
+    'decode_frame': 'binary_protocol',
+    'encode_frame': 'binary_protocol',
+    'DeviceSimulator': 'device_simulator',
+    'OverlapSaveFilter': 'fft_filter',
+    'fir_taps': 'fft_filter',
+    'FilterBank': 'filter_bank',
+    'butter_sos': 'filter_design',
+    'notch_sos': 'filter_design',
+    'HeartRateEstimator': 'hr_estimator',
+    'preload': 'lazy',
+    'DeviceState': 'multi_reader',
+    'MultiDeviceReader': 'multi_reader',
+    'available_ports': 'multi_reader',
+    'parse_samples': 'packet_parser',
+    'PacketStream': 'packet_stream',
+    'Pipeline': 'pipeline',
+    'Reading': 'pipeline',
+    'RingBuffer': 'ring_buffer',
+    'SequenceTracker': 'sequence_tracker',
+    'SerialLink': 'serial_link',
+    'SerialReader': 'serial_reader',
+    'ReplayPort': 'session_recorder',
+    'SessionRecorder': 'session_recorder',
+    'read_session': 'session_recorder',
+    'StreamingLPF': 'stream_filter',
+    'ThresholdSettings': 'threshold_settings',
+    'format_timestamp': 'timestamps',
+    'monotonic': 'timestamps',
+    'wall_time': 'timestamps',
+}
+
+__all__ = list(_EXPORTS)
+
+# Import an exported name from its module on first access
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,353 @@
+import argparse
+import csv
+import io
+import mmap
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .binary_protocol import HEADER, frame_size
+from .filter_bank import FilterBank
+from .filter_design import save_designs
+from .hr_estimator import HeartRateEstimator
+from .session_recorder import MAGIC, TIMESTAMP, record_offsets, read_records
+
+# Batch analysis of recorded sessions
+#
+# Runs the same filters and heart rate logic as the live pipeline over a
+# folder of recordings and writes one summary row per session (and
+# optionally one per minute). Inputs are session recordings (.ppgrec, see
+# session_recorder) or CSV files with one sample per row, the samples in
+# `column` (default: the last) and an optional header line.
+#
+# Every file is memory-mapped and cut into chunks of `chunk_seconds`, and
+# the chunks are spread over a process pool, so one long recording keeps
+# every core busy and no worker ever holds more than one chunk. A chunk
+# also reads the WARMUP_SECONDS before it to prime the filters and the HR
+# window; those samples are not counted again. Chunk boundaries are found
+# without reading the data (fixed-size records, or one newline search per
+# boundary for CSV), so files larger than RAM are fine.
+#
+#   python -m ppg.batch_analysis recordings/ --out summary.csv --minutes minutes.csv
+#   python -m ppg.batch_analysis --benchmark
+#
+# Quality columns: hr_coverage is the share of seconds with an estimate,
+# confirmed the share the spectrum agrees with, clipped the share of ADC
+# samples at either rail, perfusion the pulse amplitude (RMS in the
+# 0.5-5 Hz band) relative to the mean level, and band_power the share of
+# the baseline-free signal power inside the pulse band.
+Task = namedtuple('Task', ['path', 'kind', 'index', 'warmup_start', 'start', 'end', 'fs', 'column'])
+
+RECORDING = "ppgrec"
+CSV = "csv"
+EXTENSIONS = {'.ppgrec': RECORDING, '.csv': CSV}
+ADC_MAX = 4095
+WARMUP_SECONDS = 10
+
+SUMMARY_COLUMNS = ['session', 'format', 'duration_s', 'samples', 'packets_lost', 'hr_median', 'hr_p5', 'hr_p95',
+                   'hr_coverage_pct', 'confirmed_pct', 'clipped_pct', 'perfusion_pct', 'band_power_pct', 'error']
+MINUTE_COLUMNS = ['session', 'minute', 'hr_median', 'hr_coverage_pct', 'confirmed_pct']
+
+# Recordings and CSV files given directly or found under the given directories
+def find_sessions(paths):
+    sessions = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                sessions += [os.path.join(root, name) for name in sorted(files) if _kind(name)]
+        elif _kind(path):
+            sessions.append(path)
+        else:
+            raise ValueError(f"{path}: not a directory, .ppgrec or .csv file")
+    return sessions
+
+# Input format from the file extension, None if it is not an input
+def _kind(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+# Cut one file into chunk tasks of about chunk_seconds each
+def plan_tasks(path, fs=50, chunk_seconds=600, column=-1):
+    kind = _kind(path)
+    if os.path.getsize(path) == 0:
+        return []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if kind == RECORDING:
+            bounds, warmup = _recording_bounds(data, fs, chunk_seconds)
+        else:
+            bounds, warmup = _csv_bounds(data, fs, chunk_seconds)
+    return [Task(path, kind, i, warmup[i], bounds[i], bounds[i + 1], fs, column) for i in range(len(bounds) - 1)]
+
+# Chunk and warm-up start offsets of a recording, by arithmetic when all records have the same size
+def _recording_bounds(data, fs, chunk_seconds):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a session recording")
+    count_at = TIMESTAMP.size + HEADER.size - 1
+    if len(data) <= len(MAGIC) + count_at:
+        return [len(MAGIC)], []
+    samples = data[len(MAGIC) + count_at]
+    record_size = TIMESTAMP.size + frame_size(samples)
+    per_chunk = max(1, int(chunk_seconds * fs / max(samples, 1)))
+    warmup = int(np.ceil(WARMUP_SECONDS * fs / max(samples, 1)))
+
+    records = (len(data) - len(MAGIC)) // record_size
+    counts = np.frombuffer(data, np.uint8, count=records * record_size, offset=len(MAGIC))[count_at::record_size]
+    uniform = bool((counts == samples).all())
+    del counts  # Releases the map
+    if uniform:
+        offsets = range(len(MAGIC), len(MAGIC) + (records + 1) * record_size, record_size)
+    else:
+        offsets = record_offsets(data)
+        records = len(offsets)
+        if not records:
+            return [len(MAGIC)], []
+        offsets.append(offsets[-1] + TIMESTAMP.size + frame_size(data[offsets[-1] + count_at]))
+
+    firsts = list(range(0, records, per_chunk))
+    bounds = [offsets[first] for first in firsts] + [offsets[records]]
+    return bounds, [offsets[max(0, first - warmup)] for first in firsts]
+
+# Line-aligned chunk and warm-up start offsets of a CSV file, sized from the length of its first lines
+def _csv_bounds(data, fs, chunk_seconds):
+    first_end = data.find(b'\n')
+    first_end = len(data) if first_end < 0 else first_end + 1
+    try:
+        np.loadtxt(io.BytesIO(data[:first_end]), delimiter=',', ndmin=1)
+        start = 0
+    except ValueError:
+        start = first_end  # Header line
+    sample = data[start:start + 65536]
+    line_size = max(1.0, len(sample) / max(1, sample.count(b'\n')))
+    chunk_size = max(1, int(chunk_seconds * fs * line_size))
+    warmup_size = int(WARMUP_SECONDS * fs * line_size)
+
+    # Moves an offset forward to the start of the next line
+    def line_start(offset):
+        if offset <= start:
+            return start
+        if offset >= len(data):
+            return len(data)
+        end = data.find(b'\n', offset - 1)
+        return len(data) if end < 0 else end + 1
+
+    bounds = [start]
+    while bounds[-1] < len(data):
+        bounds.append(max(bounds[-1] + 1, line_start(bounds[-1] + chunk_size)))
+    return bounds, [line_start(bound - warmup_size) for bound in bounds[:-1]]
+
+# Samples of the CSV lines between two line-aligned offsets
+def _read_csv(data, start, end, column):
+    if end <= start:
+        return np.empty(0)
+    return np.loadtxt(io.BytesIO(data[start:end]), delimiter=',', usecols=column, ndmin=1)
+
+# Worker: analyse one chunk, returns a dict of sums the parent combines per session
+def analyse_chunk(task):
+    try:
+        with open(task.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if task.kind == RECORDING:
+                warmup = [frame for _, frame in read_records(data, task.warmup_start, task.start)]
+                frames = [frame for _, frame in read_records(data, task.start, task.end)]
+                skip = sum(frame.samples.size for frame in warmup)
+                samples = np.concatenate([frame.samples for frame in warmup + frames]).astype(float)
+                lost = _lost_packets([frame.seq for frame in warmup[-1:] + frames])
+            else:
+                warmup = _read_csv(data, task.warmup_start, task.start, task.column)
+                skip = warmup.size
+                samples = np.concatenate((warmup, _read_csv(data, task.start, task.end, task.column)))
+                lost = 0
+    except (OSError, ValueError) as e:
+        return {'path': task.path, 'index': task.index, 'error': f"chunk {task.index}: {e}"}
+    result = analyse_samples(samples, task.fs, skip)
+    result.update(path=task.path, index=task.index, lost=lost, error=None)
+    return result
+
+# Packets missing from a run of sequence numbers (uint16, reordered packets are not counted)
+def _lost_packets(seqs):
+    gaps = np.diff(np.asarray(seqs, dtype=np.int64)) % 0x10000
+    return int((gaps[(gaps > 1) & (gaps < 0x8000)] - 1).sum())
+
+# Filter, HR and quality sums of samples, the first `skip` only prime the filters
+def analyse_samples(samples, fs, skip=0):
+    x = np.asarray(samples, dtype=float)
+    detrended = FilterBank(fs).detrend().process(x)
+    pulse = FilterBank(fs).bandpass(0.5, 5.0).process(detrended)
+
+    # One estimate per second of data, as in the live pipeline
+    estimator = HeartRateEstimator(fs)
+    offset = skip % fs
+    if offset:
+        estimator.update(x[:offset])
+    seconds, rates, confirmed = [], [], []
+    for start in range(offset, x.size, fs):
+        bpm = estimator.update(x[start:start + fs])
+        if start >= skip:
+            seconds.append((start - skip) / fs)
+            rates.append(np.nan if bpm is None else bpm)
+            confirmed.append(estimator.confirmed)
+
+    raw = x[skip:]
+    return {'samples': raw.size,
+            'clipped': int(np.count_nonzero((raw <= 0) | (raw >= ADC_MAX))),
+            'raw_sum': float(raw.sum()),
+            'pulse_power': float(np.square(pulse[skip:]).sum()),
+            'baseline_power': float(np.square(detrended[skip:]).sum()),
+            'seconds': np.array(seconds), 'rates': np.array(rates), 'confirmed': np.array(confirmed, dtype=bool)}
+
+# Combine the chunk results of one session into its summary and per-minute rows
+def summarize(path, results, fs):
+    row = dict.fromkeys(SUMMARY_COLUMNS, '')
+    row.update(session=path, format=_kind(path))
+    errors = [result['error'] for result in results if result['error']]
+    results = sorted((result for result in results if not result['error']), key=lambda result: result['index'])
+    row['error'] = "; ".join(errors)
+    if not results:
+        return row, []
+
+    # Times of the per-second estimates from the start of the session
+    offsets = np.cumsum([0] + [result['samples'] for result in results[:-1]]) / fs
+    seconds = np.concatenate([result['seconds'] + offset for result, offset in zip(results, offsets)])
+    rates = np.concatenate([result['rates'] for result in results])
+    confirmed = np.concatenate([result['confirmed'] for result in results])
+    samples = sum(result['samples'] for result in results)
+    pulse_power = sum(result['pulse_power'] for result in results)
+    baseline_power = sum(result['baseline_power'] for result in results)
+    raw_mean = sum(result['raw_sum'] for result in results) / max(samples, 1)
+
+    valid = ~np.isnan(rates)
+    row.update(duration_s=round(samples / fs, 1), samples=samples,
+               packets_lost=sum(result['lost'] for result in results) if row['format'] == RECORDING else '',
+               hr_coverage_pct=_percent(valid.mean()), confirmed_pct=_percent(confirmed.mean()),
+               clipped_pct=_percent(sum(result['clipped'] for result in results) / max(samples, 1)),
+               perfusion_pct=_percent(np.sqrt(pulse_power / max(samples, 1)) / raw_mean if raw_mean else 0.0, 3),
+               band_power_pct=_percent(pulse_power / baseline_power if baseline_power else 0.0))
+    if valid.any():
+        p5, median, p95 = np.percentile(rates[valid], [5, 50, 95])
+        row.update(hr_median=round(median, 1), hr_p5=round(p5, 1), hr_p95=round(p95, 1))
+
+    minute_rows = []
+    minutes = (seconds // 60).astype(int)
+    for minute in np.unique(minutes):
+        in_minute = minutes == minute
+        minute_rates = rates[in_minute & valid]
+        minute_rows.append({'session': path, 'minute': int(minute),
+                            'hr_median': round(float(np.median(minute_rates)), 1) if minute_rates.size else '',
+                            'hr_coverage_pct': _percent(valid[in_minute].mean()),
+                            'confirmed_pct': _percent(confirmed[in_minute].mean())})
+    return row, minute_rows
+
+# A fraction as a rounded percentage
+def _percent(fraction, digits=1):
+    return round(100.0 * float(fraction), digits)
+
+# Analyse every session, returns (summary rows, minute rows)
+def analyse(paths, fs=50, jobs=None, chunk_seconds=600, column=-1):
+    sessions = find_sessions(paths)
+    results = {path: [] for path in sessions}
+    tasks = []
+    for path in sessions:
+        try:
+            tasks += plan_tasks(path, fs, chunk_seconds, column)
+        except (OSError, ValueError) as e:
+            results[path].append({'path': path, 'index': -1, 'error': str(e)})
+    tasks.sort(key=lambda task: task.end - task.warmup_start, reverse=True)  # Big chunks first, the pool ends evenly
+
+    # Design the filters once here, so the workers do not all design (and cache) them
+    analyse_samples(np.zeros(fs), fs)
+    save_designs()
+
+    if jobs == 1:
+        for task in tasks:
+            result = analyse_chunk(task)
+            results[result['path']].append(result)
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            for result in pool.imap_unordered(analyse_chunk, tasks):
+                results[result['path']].append(result)
+
+    summary, minutes = [], []
+    for path in sessions:
+        row, minute_rows = summarize(path, results[path], fs)
+        summary.append(row)
+        minutes += minute_rows
+    return summary, minutes
+
+# Write rows as a CSV table
+def write_table(path, rows, columns):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+# Print the summary as an aligned table
+def print_summary(rows):
+    columns = ['duration_s', 'packets_lost', 'hr_median', 'hr_p5', 'hr_p95', 'hr_coverage_pct', 'confirmed_pct',
+               'clipped_pct', 'perfusion_pct', 'band_power_pct']
+    width = max([len('session')] + [len(os.path.basename(row['session'])) for row in rows])
+    print(f"{'session':{width}s} " + " ".join(f"{column:>15s}" for column in columns))
+    for row in rows:
+        print(f"{os.path.basename(row['session']):{width}s} " + " ".join(f"{row[column]!s:>15s}" for column in columns))
+        if row['error']:
+            print(f"    error: {row['error']}")
+
+# Write synthetic sessions (recordings with dropouts and CSV files) for the benchmark
+def write_test_sessions(folder, recordings=8, csv_files=2, minutes=20, fs=50):
+    from .binary_protocol import decode_frame
+    from .device_simulator import DeviceSimulator
+    from .session_recorder import SessionRecorder
+
+    for i in range(recordings + csv_files):
+        simulator = DeviceSimulator(heart_rate=60 + 5 * i, binary=True, dropout=0.01, speed=None, fs=fs, seed=i)
+        packets = simulator.packets()
+        if i < recordings:
+            recorder = SessionRecorder(os.path.join(folder, f"session{i}.ppgrec"))
+            for second in range(minutes * 60):
+                frame = decode_frame(next(packets))
+                recorder.write(1.7e9 + second, frame.samples, frame.heart_rate, frame.threshold, frame.seq)
+            recorder.close()
+        else:
+            samples = np.concatenate([decode_frame(next(packets)).samples for _ in range(minutes * 60)])
+            t = np.arange(samples.size) / fs
+            np.savetxt(os.path.join(folder, f"session{i}.csv"), np.column_stack((t, samples)),
+                       fmt=['%.2f', '%d'], delimiter=',', header='time,ppg', comments='')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Filter, heart rate and signal quality summary of recorded sessions")
+    parser.add_argument('paths', nargs='*', help=".ppgrec/.csv files or directories holding them")
+    parser.add_argument('--fs', type=int, default=50, help="sampling rate in Hz")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--chunk-seconds', type=float, default=600, help="length of the chunks given to the workers")
+    parser.add_argument('--column', type=int, default=-1, help="CSV column holding the samples")
+    parser.add_argument('--out', help="write the per-session summary to this CSV file")
+    parser.add_argument('--minutes', help="write per-minute heart rates to this CSV file")
+    parser.add_argument('--benchmark', action='store_true', help="time synthetic sessions with 1..N workers and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as folder:
+            write_test_sessions(folder, fs=args.fs)
+            hours = sum(os.path.getsize(path) > 0 for path in find_sessions([folder])) * 20 / 60
+            cores = os.cpu_count() or 1
+            baseline = None
+            for jobs in sorted({1, 2, 4, cores}):
+                start = time.perf_counter()
+                summary, _ = analyse([folder], args.fs, jobs, args.chunk_seconds)
+                seconds = time.perf_counter() - start
+                baseline = baseline or seconds
+                print(f"{jobs:2d} workers: {hours:.1f} h of data in {seconds:.2f} s "
+                      f"({hours * 3600 / seconds:.0f}x real time, speed-up {baseline / seconds:.2f}, {cores} cores)")
+            print_summary(summary)
+    else:
+        if not args.paths:
+            parser.error("no recordings given")
+        summary, minutes = analyse(args.paths, args.fs, args.jobs, args.chunk_seconds, args.column)
+        print_summary(summary)
+        if args.out:
+            write_table(args.out, summary, SUMMARY_COLUMNS)
+        if args.minutes:
+            write_table(args.minutes, minutes, MINUTE_COLUMNS)
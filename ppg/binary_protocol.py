@@ -0,0 +1,64 @@
+import binascii
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Compact binary frame sent by the firmware when BINARY_PROTOCOL is enabled
+#
+#   offset  size  field
+#   0       2     sync bytes 0xA5 0x5A
+#   2       2     sequence number (uint16, little endian)
+#   4       1     sample count N
+#   5       2*N   raw samples (uint16, little endian)
+#   5+2N    2     heart rate in tenths of a BPM (uint16)
+#   7+2N    2     adaptive threshold (uint16)
+#   9+2N    2     CRC-16/CCITT-FALSE over bytes 2 .. 8+2N
+#
+# 0xA5 never starts a line of the text protocol, so a reader can tell the
+# two formats apart from the first byte.
+SYNC = b'\xa5\x5a'
+HEADER = struct.Struct('<2sHB')
+TRAILER = struct.Struct('<HHH')
+
+Frame = namedtuple('Frame', ['seq', 'samples', 'heart_rate', 'threshold'])
+
+# CRC-16/CCITT-FALSE (same as the firmware's crc16())
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+# Size of a whole frame holding n samples
+def frame_size(n):
+    return HEADER.size + 2 * n + TRAILER.size
+
+# Build a frame (used by the simulator and for testing the decoder)
+def encode_frame(seq, samples, heart_rate, threshold):
+    samples = np.asarray(samples, dtype='<u2')
+    body = struct.pack('<HB', seq & 0xFFFF, samples.size) + samples.tobytes() + \
+        struct.pack('<HH', int(round(heart_rate * 10)), int(threshold))
+    return SYNC + body + struct.pack('<H', crc16(body))
+
+# Decode a complete frame, raises ValueError if it is malformed
+def decode_frame(data):
+    data = bytes(data)
+    if len(data) < HEADER.size + TRAILER.size:
+        raise ValueError("frame too short")
+    sync, seq, count = HEADER.unpack_from(data)
+    if sync != SYNC:
+        raise ValueError("bad sync bytes")
+    if len(data) != frame_size(count):
+        raise ValueError("frame length does not match sample count")
+    heart_rate, threshold, crc = TRAILER.unpack_from(data, HEADER.size + 2 * count)
+    if crc16(data[2:-2]) != crc:
+        raise ValueError("CRC mismatch")
+    samples = np.frombuffer(data, dtype='<u2', count=count, offset=HEADER.size).astype(int)
+    return Frame(seq, samples, heart_rate / 10.0, threshold)
+
+# Read the rest of a frame from a serial port once the first sync byte has been seen
+def read_frame(ser):
+    rest = ser.read(HEADER.size - 1)
+    if len(rest) < HEADER.size - 1 or rest[:1] != SYNC[1:]:
+        raise ValueError("incomplete frame header")
+    count = rest[-1]
+    body = ser.read(2 * count + TRAILER.size)
+    return decode_frame(SYNC[:1] + rest + body)
@@ -0,0 +1,227 @@
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import serial
+
+from .binary_protocol import encode_frame
+
+# Stand-in for the ESP32 running nathan_arduino.ino
+#
+# Generates a synthetic PPG waveform (systolic peak plus dicrotic wave,
+# baseline wander and noise) at 50 Hz and sends one packet per second in
+# the firmware's exact wire format:
+#
+#   "R, 812,1903,...,2044\n\n"   50 "%4d" samples (the firmware ends the
+#                                line with its own "\n", hence the blank line)
+#   "H,72.289154\n"              heart rate from the firmware's EMA crossing
+#   "T,1945\n"                   adaptive threshold
+#   "S,17\n"                     sequence number
+#
+# or the equivalent binary frame with binary=True. The H and T values come
+# from the same EMA threshold algorithm as the firmware, so they are as
+# noisy as the real ones. Packets can be dropped (the sequence number still
+# advances) or swapped with the next one, and speed=N sends N packets per
+# second of wall time (None sends as fast as the port takes them).
+#
+# The data is written to a pyserial "loop://" port (open_loop) or to a
+# pseudo terminal (open_pty) that the GUI scripts can open like COM5.
+class DeviceSimulator:
+    SAMPLES_PER_PACKET = 50
+
+    # Constructor
+    def __init__(self, heart_rate=72.0, noise=5.0, dropout=0.0, reorder=0.0,
+                 speed=1.0, binary=False, fs=50, seed=None):
+        self.heart_rate = heart_rate
+        self.noise = noise
+        self.dropout = dropout
+        self.reorder = reorder
+        self.speed = speed
+        self.binary = binary
+        self.fs = fs
+        self.rng = np.random.default_rng(seed)
+        self.sent = 0
+        self.dropped = 0
+        self.reordered = 0
+        self._thread = None
+        self._pty = None
+        self._stop_event = threading.Event()
+
+        # Waveform state
+        self._phase = 0.0
+        self._sample_index = 0
+
+        # Firmware state (see nathan_arduino.ino)
+        self._millis = 0
+        self._ema = 1900.0
+        self._threshold = 0
+        self._old_state = False
+        self._last_transition = 0
+        self._device_heart_rate = 0.0
+        self._order = 1
+
+    # Next packet's worth of synthetic PPG samples (ADC counts)
+    def _next_samples(self):
+        n = self.SAMPLES_PER_PACKET
+        beat_hz = max(self.heart_rate + self.rng.normal(0, 1.5), 1.0) / 60.0  # Some HR variability
+        phase = self._phase + beat_hz / self.fs * np.arange(1, n + 1)
+        self._phase = phase[-1] % 1.0
+        p = phase % 1.0
+
+        pulse = np.exp(-((p - 0.15) / 0.06) ** 2) + 0.35 * np.exp(-((p - 0.45) / 0.08) ** 2)
+        t = (self._sample_index + np.arange(n)) / self.fs
+        self._sample_index += n
+        wander = 20 * np.sin(2 * np.pi * 0.1 * t)
+        signal = 1850 + 150 * pulse + wander + self.rng.normal(0, self.noise, n)
+        return np.clip(np.round(signal), 0, 4095).astype(int)
+
+    # Run the firmware's EMA threshold crossing over the samples
+    def _firmware(self, samples):
+        for value in samples.tolist():
+            millis = self._millis
+            self._millis += 1000 // self.fs
+            self._ema = 0.01 * value + 0.99 * self._ema
+            self._threshold = int(self._ema + 45)
+            state = value > self._threshold
+            if state and not self._old_state:
+                period = millis - self._last_transition
+                self._last_transition = millis
+                if period > 0:
+                    self._device_heart_rate = 60000.0 / period
+            self._old_state = state
+        return self._device_heart_rate, self._threshold
+
+    # Encode one packet in the firmware's wire format
+    def _encode(self, seq, samples, heart_rate, threshold):
+        if self.binary:
+            return encode_frame(seq, samples, min(heart_rate, 6553.5), threshold)
+        raw = ",".join(f"{v:4d}" for v in samples.tolist())
+        return (f"R,{raw}\n\n" f"H,{heart_rate:f}\n" f"T,{threshold}\n" f"S,{seq}\n").encode('ascii')
+
+    # Generate the next second of data, returns the encoded packet
+    def next_packet(self):
+        samples = self._next_samples()
+        heart_rate, threshold = self._firmware(samples)
+        seq = self._order
+        self._order += 1
+        return self._encode(seq, samples, heart_rate, threshold)
+
+    # Yield the packets as they go on the wire, with dropouts and reordering applied
+    def packets(self):
+        held = None
+        while True:
+            packet = self.next_packet()
+            if self.rng.random() < self.dropout:
+                self.dropped += 1
+                continue
+            if held is None and self.rng.random() < self.reorder:
+                held = packet  # Send it after the next one
+                self.reordered += 1
+                continue
+            yield packet
+            if held is not None:
+                yield held
+                held = None
+
+    # Send packets with write() until stopped or count packets were sent
+    def run(self, write, count=None):
+        interval = 1.0 / self.speed if self.speed else 0.0
+        due = time.monotonic()
+        for packet in self.packets():
+            if self._stop_event.is_set() or (count is not None and self.sent >= count):
+                break
+            if interval:
+                due += interval
+                delay = due - time.monotonic()
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+            write(packet)
+            self.sent += 1
+
+    # Run in a background thread
+    def start(self, write, count=None):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, args=(write, count), daemon=True)
+        self._thread.start()
+
+    # Stop the background thread and close the pseudo terminal if there is one
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pty is not None:
+            for fd in self._pty:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._pty = None
+
+    # Start sending into a pyserial loop:// port and return it, use it in place of serial.Serial
+    def open_loop(self, timeout=1, count=None):
+        port = serial.serial_for_url('loop://', timeout=timeout)
+        self.start(port.write, count)
+        return port
+
+    # Start sending into a pseudo terminal and return the device name to open (POSIX only)
+    def open_pty(self, count=None):
+        import tty  # Not available on Windows
+
+        master, slave = os.openpty()
+        tty.setraw(slave)  # No echo or newline translation, like a real serial port
+        self._pty = (master, slave)
+        self.start(lambda data: os.write(master, data), count)
+        return os.ttyname(slave)
+
+# Measure how fast packets can be generated and ingested through SerialReader
+def benchmark(packets=2000, binary=False):
+    from .packet_parser import parse_samples
+    from .serial_reader import SerialReader
+
+    simulator = DeviceSimulator(speed=None, binary=binary, seed=0)
+    start = time.perf_counter()
+    port = simulator.open_loop(timeout=0.1, count=packets)
+    reader = SerialReader(port, maxsize=0)
+    reader.start()
+    received = 0
+    while received < packets:
+        for _, item in reader.drain():
+            if binary:
+                received += 1
+            elif item.startswith("R,"):
+                parse_samples(item[2:])
+            elif item.startswith("S,"):
+                received += 1
+        time.sleep(0.001)
+    seconds = time.perf_counter() - start
+    reader.stop()
+    simulator.stop()
+    rate = packets / seconds
+    print(f"{'binary' if binary else 'text'}: {rate:.0f} packets/s ingested "
+          f"({rate:.0f}x real time, {rate * DeviceSimulator.SAMPLES_PER_PACKET:.0f} samples/s)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate the PPG device on a pseudo terminal")
+    parser.add_argument('--hr', type=float, default=72.0, help="heart rate in BPM")
+    parser.add_argument('--noise', type=float, default=5.0, help="noise standard deviation in ADC counts")
+    parser.add_argument('--dropout', type=float, default=0.0, help="probability of dropping a packet")
+    parser.add_argument('--reorder', type=float, default=0.0, help="probability of swapping a packet with the next")
+    parser.add_argument('--speed', type=float, default=1.0, help="packets per second of wall time, 0 = unlimited")
+    parser.add_argument('--binary', action='store_true', help="send binary frames instead of text lines")
+    parser.add_argument('--benchmark', action='store_true', help="measure ingest throughput and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(binary=False)
+        benchmark(binary=True)
+    else:
+        simulator = DeviceSimulator(args.hr, args.noise, args.dropout, args.reorder,
+                                    args.speed or None, args.binary)
+        print(f"Simulated device on {simulator.open_pty()}, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            simulator.stop()
@@ -0,0 +1,161 @@
+import numpy as np
+
+# Streaming FFT-domain FIR filter (overlap-save)
+#
+# The taps are a linear-phase windowed-sinc design, made with numpy only.
+# Each block of `nfft` samples holds the last numtaps - 1 inputs followed
+# by `step` new ones; multiplying its rfft by the cached spectrum of the
+# taps and taking the irfft gives `step` exact outputs of the linear
+# convolution (the first numtaps - 1 wrap around and are discarded). So
+# the output is the same as np.convolve, with no ringing at the block
+# edges, however the input is split into chunks: samples are collected in
+# a fixed buffer and a block is filtered whenever `step` new ones are in.
+# process() returns the outputs completed so far, so its output length
+# varies with the chunking, and memory stays constant however long the
+# recording is. The output is delayed by `delay` samples (half the taps)
+# plus up to one block while it is being collected.
+_taps = {}
+_spectra = {}
+
+# Hamming-windowed sinc taps, cutoff in Hz (a (low, high) pair for btype='band')
+def fir_taps(cutoff, fs, numtaps=101, btype='low'):
+    key = (btype, numtaps, tuple(np.atleast_1d(cutoff).tolist()), float(fs))
+    if key not in _taps:
+        n = np.arange(numtaps) - (numtaps - 1) / 2.0
+        window = np.hamming(numtaps)
+
+        # Low-pass with unit gain at DC
+        def lowpass(f):
+            h = 2 * f / fs * np.sinc(2 * f / fs * n) * window
+            return h / h.sum()
+
+        if btype == 'low':
+            taps = lowpass(cutoff)
+        elif btype == 'band':
+            taps = lowpass(cutoff[1]) - lowpass(cutoff[0])
+        else:
+            raise ValueError(f"unsupported filter type {btype!r}")
+        taps.setflags(write=False)
+        _taps[key] = taps
+    return _taps[key]
+
+# rfft of the taps zero-padded to nfft, shared by all filters with the same design
+def _spectrum(taps, nfft):
+    key = (taps.tobytes(), nfft)
+    if key not in _spectra:
+        spectrum = np.fft.rfft(taps, nfft)
+        spectrum.setflags(write=False)
+        _spectra[key] = spectrum
+    return _spectra[key]
+
+# Overlap-save FIR filter for one stream of any chunk size
+class OverlapSaveFilter:
+    # Constructor, nfft defaults to the smallest power of two of at least 5x numtaps
+    def __init__(self, taps, nfft=None):
+        self.taps = np.asarray(taps, dtype=float)
+        self.overlap = len(self.taps) - 1
+        self.nfft = nfft or 1 << int(np.ceil(np.log2(5 * len(self.taps))))
+        if self.nfft <= self.overlap:
+            raise ValueError("nfft must be larger than the number of taps")
+        self.step = self.nfft - self.overlap  # New samples per block
+        self.delay = self.overlap // 2  # Group delay of the linear-phase taps
+        self.spectrum = _spectrum(self.taps, self.nfft)
+        self._block = np.empty(self.nfft)
+        self.reset()
+
+    # Forget the signal history (e.g. after a reconnect)
+    def reset(self):
+        self._fill = None  # New samples in the current block, None before the first one
+
+    # Add samples of any chunk size, returns the outputs of the blocks they completed
+    def process(self, samples):
+        x = np.asarray(samples, dtype=float).ravel()
+        if x.size == 0:
+            return x
+        if self._fill is None:
+            # Start in steady state at the first sample to avoid a step transient
+            self._block[:self.overlap] = x[0]
+            self._fill = 0
+
+        outputs = []
+        start = 0
+        while start < x.size:
+            n = min(self.step - self._fill, x.size - start)
+            at = self.overlap + self._fill
+            self._block[at:at + n] = x[start:start + n]
+            self._fill += n
+            start += n
+            if self._fill == self.step:
+                outputs.append(self._filter_block(self.step))
+                self._block[:self.overlap] = self._block[self.step:]  # Keep the last numtaps - 1 inputs
+                self._fill = 0
+        if not outputs:
+            return np.empty(0)
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
+
+    # Outputs of the samples still being collected, as if the input held its last value, and reset (end of a recording)
+    def flush(self):
+        fill = self._fill
+        self.reset()
+        if not fill:
+            return np.empty(0)
+        at = self.overlap + fill
+        self._block[at:] = self._block[at - 1]
+        return self._filter_block(fill)
+
+    # Filter the current block, returns its first count valid outputs
+    def _filter_block(self, count):
+        y = np.fft.irfft(np.fft.rfft(self._block) * self.spectrum, self.nfft)
+        return y[self.overlap:self.overlap + count]
+
+    # Filter a whole recording (any sized array or memory map) block by block, yielding the outputs
+    def filter_blocks(self, data, chunk_size=1 << 16):
+        self.reset()
+        for start in range(0, len(data), chunk_size):
+            y = self.process(data[start:start + chunk_size])
+            if y.size:
+                yield y
+        y = self.flush()
+        if y.size:
+            yield y
+
+# Compare with np.convolve and time against the Butterworth path
+if __name__ == '__main__':
+    import timeit
+
+    from .device_simulator import DeviceSimulator
+    from .filter_bank import FilterBank
+
+    fs = 50
+    simulator = DeviceSimulator(speed=None, seed=0)
+    x = np.concatenate([simulator._next_samples() for _ in range(3600)]).astype(float)  # One hour
+    packets = np.split(x, len(x) // DeviceSimulator.SAMPLES_PER_PACKET)
+
+    taps = fir_taps(2.5, fs)
+    ols = OverlapSaveFilter(taps)
+
+    # Chunking must not change the output: compare with a direct convolution of the padded input
+    rng = np.random.default_rng(0)
+    chunks = np.split(x[:5000], np.sort(rng.choice(5000, 40, replace=False)))
+    streamed = np.concatenate([ols.process(chunk) for chunk in chunks] + [ols.flush()])
+    padded = np.concatenate((np.full(ols.overlap, x[0]), x[:5000]))
+    direct = np.convolve(padded, taps, mode='valid')
+    print(f"{len(taps)} taps, nfft {ols.nfft}, step {ols.step}: random chunking vs np.convolve "
+          f"max error {np.abs(streamed - direct).max():.1e}")
+
+    # Live packets and a long recording, against the same cutoff through the Butterworth filter bank
+    # (larger blocks for the recording, the latency does not matter there)
+    offline = OverlapSaveFilter(taps, nfft=8192)
+    bank = FilterBank(fs).lowpass(2.5, 5)
+    bank.process(x[:50])
+    for name, run_ols, run_bank in [
+            ("50-sample packets", lambda: [ols.process(p) for p in packets], lambda: [bank.process(p) for p in packets]),
+            ("whole recording", lambda: list(offline.filter_blocks(x)), lambda: bank.process(x))]:
+        ols.reset()
+        bank.reset()
+        ols_seconds = min(timeit.repeat(run_ols, number=1, repeat=3))
+        bank_seconds = min(timeit.repeat(run_bank, number=1, repeat=3))
+        print(f"{name:18s}: overlap-save {len(x) / ols_seconds / 1e6:5.1f} M samples/s, "
+              f"Butterworth sosfilt {len(x) / bank_seconds / 1e6:5.1f} M samples/s")
+    print(f"delay: overlap-save {ols.delay} samples + up to {ols.step} while a block fills, "
+          f"Butterworth about {np.argmax(bank.filter(np.r_[1.0, np.zeros(499)]))} samples (non-linear phase)")
@@ -0,0 +1,120 @@
+import atexit
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from .lazy import LazyModule
+
+signal = LazyModule('scipy.signal')
+
+# Cached filter designs
+#
+# Designing a filter needs scipy.signal, which takes about a second to
+# import. Every design is kept in memory, keyed by its type and
+# parameters, and in a small .npz file, so from the second start on the
+# filters are set up without importing scipy (it is then loaded in the
+# background, or when the first samples are filtered). A design is the
+# SOS coefficients together with the sosfilt_zi steady state for a unit
+# step.
+#
+# New designs are written SAVE_DELAY seconds after the last miss (and at
+# exit, or by save_designs()), so setting up a whole pipeline writes the
+# file once. Each write goes through its own temporary file, so processes
+# sharing the cache never install each other's half-written files, and a
+# corrupt cache file is deleted and rebuilt.
+CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'ppg', 'filter_designs.npz')
+SAVE_DELAY = 1.0
+
+_designs = {}
+_loaded = set()
+_unsaved = set()  # Cache files missing some of the designs
+_timer = None
+_lock = threading.Lock()
+
+# SOS coefficients and unit-step filter state of a Butterworth design (cutoff in Hz)
+def butter_sos(order, cutoff, fs, btype='low', cache_file=CACHE_FILE):
+    edges = "_".join(repr(float(c)) for c in np.atleast_1d(cutoff))
+    key = f"{btype}-{order}-{edges}-{float(fs)!r}"
+    return _design(key, lambda: signal.butter(order, cutoff, btype=btype, fs=fs, output='sos'), cache_file)
+
+# SOS coefficients and unit-step filter state of a notch at freq Hz (e.g. mains hum)
+def notch_sos(freq, fs, quality=30.0, cache_file=CACHE_FILE):
+    key = f"notch-2-{float(freq)!r}_{float(quality)!r}-{float(fs)!r}"
+    return _design(key, lambda: signal.tf2sos(*signal.iirnotch(freq, quality, fs=fs)), cache_file)
+
+# Look a design up, designing and caching it on a miss
+def _design(key, design, cache_file):
+    with _lock:
+        if key not in _designs and cache_file:
+            _load(cache_file)
+        if key not in _designs:
+            sos = design()
+            _designs[key] = (sos, signal.sosfilt_zi(sos))
+            if cache_file:
+                _schedule_save(cache_file)
+        return _designs[key]
+
+# Write the new designs once no more have been made for SAVE_DELAY seconds
+def _schedule_save(cache_file):
+    global _timer
+    _unsaved.add(cache_file)
+    if _timer is not None:
+        _timer.cancel()
+    _timer = threading.Timer(SAVE_DELAY, save_designs)
+    _timer.daemon = True
+    _timer.start()
+
+# Write the designs made since the last write, e.g. before starting worker processes
+def save_designs():
+    global _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        for cache_file in _unsaved:
+            _save(cache_file)
+        _unsaved.clear()
+
+atexit.register(save_designs)
+
+# Read the cached designs once, a missing file is ignored and an unreadable one deleted
+def _load(cache_file):
+    if cache_file in _loaded:
+        return
+    _loaded.add(cache_file)
+    try:
+        with np.load(cache_file, allow_pickle=False) as data:
+            for name in data.files:
+                if name.endswith(".sos"):
+                    key = name[:-len(".sos")]
+                    _designs.setdefault(key, (data[name], data[key + ".zi"]))
+    except FileNotFoundError:
+        pass
+    except Exception:  # Truncated or corrupt (e.g. zipfile.BadZipFile), rebuilt on the next write
+        try:
+            os.remove(cache_file)
+        except OSError:
+            pass
+
+# Write all designs, failing quietly (the cache only saves time)
+def _save(cache_file):
+    arrays = {}
+    for key, (sos, zi) in _designs.items():
+        arrays[key + ".sos"] = sos
+        arrays[key + ".zi"] = zi
+    temp_file = None
+    try:
+        folder = os.path.dirname(cache_file)
+        os.makedirs(folder, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=folder, prefix=".designs-", suffix=".npz", delete=False) as f:
+            temp_file = f.name
+            np.savez(f, **arrays)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        if temp_file is not None:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
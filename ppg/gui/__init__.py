@@ -0,0 +1,3 @@
+# Drawing helpers for the GUI scripts (matplotlib plots, Tk canvas alarms,
+# the log widget). Kept out of the headless ppg package so that importing
+# ppg does not need a display.
@@ -0,0 +1,103 @@
+# High / Normal / Low alarm LEDs on a Tk canvas
+#
+# The canvas items are created once; state changes only recolour them with
+# itemconfig, and only the items whose colour actually changes. Flashing is
+# driven by Tk's after() timer, so nothing ever sleeps on the GUI thread.
+#
+# States of an alarm LED:
+#   active       condition present, not acknowledged -> flashes
+#   silenced     condition present, acknowledged     -> steady on
+#   latched      condition gone, not acknowledged    -> steady on until acknowledged
+# Clicking the indicator (or calling acknowledge()) acknowledges the alarms.
+class AlarmIndicator:
+    COLORS = {"high": "red", "normal": "green", "low": "blue"}
+    POSITIONS = {"high": (50, 50), "normal": (150, 50), "low": (250, 50)}
+    OFF = "grey"
+
+    # Constructor
+    def __init__(self, canvas, latch=True, flash_ms=500):
+        self.canvas = canvas
+        self.latch = latch
+        self.flash_ms = flash_ms
+        self.state = "normal"
+        self.latched = set()
+        self.acknowledged = set()
+        self._flash_on = True
+        self._after_id = None
+        self._fills = {}
+
+        # Create the items once
+        self.leds = {}
+        for key, (x, y) in self.POSITIONS.items():
+            self.leds[key] = canvas.create_oval(x - 20, y - 20, x + 20, y + 20, fill=self.OFF)
+            canvas.create_text(x, y + 30, text=key.capitalize(), font=("Helvetica", 12))
+        canvas.create_text(150, 10, text="ALARMS", font=("Helvetica", 16))
+        self.hint = canvas.create_text(150, 110, text="", font=("Helvetica", 10))
+        canvas.bind('<Button-1>', lambda event: self.acknowledge())
+        self._render()
+
+    # Set the current condition ("high", "normal" or "low"), does nothing if unchanged
+    def set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if state != "normal":
+            self.acknowledged.discard(state)  # A new occurrence needs a new acknowledgement
+            if self.latch:
+                self.latched.add(state)
+        self._render()
+
+    # Acknowledge all alarms: latched ones clear, an active one stops flashing
+    def acknowledge(self):
+        self.latched.clear()
+        if self.state != "normal":
+            self.acknowledged.add(self.state)
+        self._render()
+
+    # True while an alarm flashes or waits for acknowledgement
+    def needs_attention(self):
+        return self._flashing() or bool(self.latched - {self.state})
+
+    # Stop the flash timer (call before the window closes)
+    def close(self):
+        if self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
+
+    # The alarm LED that flashes, if any
+    def _flashing(self):
+        if self.state != "normal" and self.state not in self.acknowledged:
+            return self.state
+        return None
+
+    # Recolour the LEDs that changed and keep the flash timer running while needed
+    def _render(self):
+        flashing = self._flashing()
+        for key, item in self.leds.items():
+            if key == flashing:
+                fill = self.COLORS[key] if self._flash_on else self.OFF
+            elif key == self.state or key in self.latched:
+                fill = self.COLORS[key]
+            else:
+                fill = self.OFF
+            if self._fills.get(key) != fill:
+                self.canvas.itemconfig(item, fill=fill)
+                self._fills[key] = fill
+
+        hint = "Click to acknowledge" if self.needs_attention() else ""
+        if self._fills.get("hint") != hint:
+            self.canvas.itemconfig(self.hint, text=hint)
+            self._fills["hint"] = hint
+
+        if flashing and self._after_id is None:
+            self._after_id = self.canvas.after(self.flash_ms, self._toggle)
+        elif not flashing and self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
+            self._flash_on = True
+
+    # Timer callback: flip the flashing LED
+    def _toggle(self):
+        self._after_id = None
+        self._flash_on = not self._flash_on
+        self._render()
@@ -0,0 +1,110 @@
+import numpy as np
+
+# Incremental (blitted) line plot on an embedded Matplotlib canvas
+#
+# The Line2D artists are created once and marked animated, so a full
+# canvas.draw() only renders the static parts (axes, ticks, legend) and
+# caches them as the background. Each update() then restores that
+# background and redraws just the lines. Axis limits are sticky: a full
+# redraw only happens when the data leaves the current range.
+class LivePlot:
+    # Constructor
+    def __init__(self, canvas, ax, xmargin=0.0, ymargin=0.1):
+        self.canvas = canvas
+        self.ax = ax
+        self.xmargin = xmargin
+        self.ymargin = ymargin
+        self.lines = {}
+        self._background = None
+        self._needs_full_draw = True
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    # Add a line artist, e.g. add_line("raw", label="Raw Pulse Data")
+    def add_line(self, name, **kwargs):
+        line, = self.ax.plot([], [], animated=True, **kwargs)
+        self.lines[name] = line
+        return line
+
+    # Add a horizontal line that stays hidden until a value is set
+    def add_hline(self, name, **kwargs):
+        line = self.ax.axhline(y=0, animated=True, visible=False, **kwargs)
+        self.lines[name] = line
+        return line
+
+    # Build the legend once all artists have been added
+    def legend(self, **kwargs):
+        self.ax.legend(**kwargs)
+
+    # Replace the data of a line (x defaults to the sample index)
+    def set_data(self, name, y, x=None):
+        y = np.asarray(y)
+        if x is None:
+            x = np.arange(len(y))
+        self.lines[name].set_data(x, y)
+
+    # Move a horizontal line
+    def set_hline(self, name, y):
+        line = self.lines[name]
+        line.set_ydata([y, y])
+        line.set_visible(True)
+
+    # Redraw the lines, falling back to a full draw only when limits change
+    def update(self):
+        if self._rescale() or self._needs_full_draw or self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_lines()
+        self.canvas.blit(self.ax.bbox)
+
+    # Force a full redraw on the next update (e.g. after the canvas is shown again)
+    def invalidate(self):
+        self._needs_full_draw = True
+
+    # Cache the static background after every full draw
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._needs_full_draw = False
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for line in self.lines.values():
+            if line.get_visible():
+                self.ax.draw_artist(line)
+
+    # Widen the axis limits if the data has left them, returns True if changed
+    def _rescale(self):
+        xs, ys = [], []
+        for line in self.lines.values():
+            if not line.get_visible():
+                continue
+            y = np.asarray(line.get_ydata(), dtype=float)
+            if y.size == 0:
+                continue
+            ys.append((np.nanmin(y), np.nanmax(y)))
+            # Horizontal lines span the axes and have no x extent of their own
+            if line.get_transform() is self.ax.transData:
+                x = np.asarray(line.get_xdata(), dtype=float)
+                xs.append((np.nanmin(x), np.nanmax(x)))
+
+        changed = False
+        if xs:
+            limits = self._expand(xs, self.ax.get_xlim(), self.xmargin)
+            if limits is not None:
+                self.ax.set_xlim(limits)
+                changed = True
+        if ys:
+            limits = self._expand(ys, self.ax.get_ylim(), self.ymargin)
+            if limits is not None:
+                self.ax.set_ylim(limits)
+                changed = True
+        return changed
+
+    @staticmethod
+    def _expand(ranges, current, margin):
+        lo = min(r[0] for r in ranges)
+        hi = max(r[1] for r in ranges)
+        if current[0] <= lo and hi <= current[1]:
+            return None
+        pad = margin * (hi - lo) if hi > lo else 0.5
+        return lo - pad, hi + pad
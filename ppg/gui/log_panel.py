@@ -0,0 +1,115 @@
+import logging
+import logging.handlers
+import queue
+import time
+from collections import deque, namedtuple
+
+from ..timestamps import format_timestamp
+
+# Bounded, batched event log
+#
+# log() only appends a structured entry to an in-memory ring and to a
+# pending list, so it is cheap to call from packet handlers. flush() is
+# called once per frame and writes the pending lines into the Multiline
+# with a single Tk insert, then deletes the oldest lines so the widget never
+# holds more than max_lines (a Tk Text widget gets slower the more it
+# holds). Everything is also mirrored to a rotating log file through a
+# QueueHandler, so file I/O happens on the listener thread and never on
+# the GUI thread.
+LogEntry = namedtuple('LogEntry', ['time', 'level', 'message'])
+
+class LogPanel:
+    # Constructor, element is the PySimpleGUI Multiline (or None for file/memory only)
+    def __init__(self, element=None, max_lines=500, history=5000, file_path=None,
+                 max_bytes=5 * 1024 * 1024, backup_count=5, autoscroll=True):
+        self.widget = element.Widget if element is not None else None
+        self.max_lines = max_lines
+        self.autoscroll = autoscroll
+        self.entries = deque(maxlen=history)
+        self._pending = deque(maxlen=max_lines)  # Lines older than that would be trimmed anyway
+        self._lines = 0  # Lines currently in the widget
+
+        self._listener = None
+        self._logger = logging.getLogger(f"ppg.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.DEBUG)
+        if file_path:
+            handler = logging.handlers.RotatingFileHandler(file_path, maxBytes=max_bytes,
+                                                           backupCount=backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+            log_queue = queue.SimpleQueue()
+            self._logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            self._listener = logging.handlers.QueueListener(log_queue, handler)
+            self._listener.start()
+
+    # Add an entry (when is a wall-clock time), shown in the widget on the next flush()
+    def log(self, message, level=logging.INFO, when=None):
+        when = time.time() if when is None else when
+        self.entries.append(LogEntry(when, level, message))
+        self._pending.append(f"{format_timestamp(when)}: {message}")
+        self._logger.log(level, message)
+
+    # Shorthand for a warning entry
+    def warning(self, message, when=None):
+        self.log(message, logging.WARNING, when)
+
+    # Write the pending lines to the widget in one go and trim the oldest ones
+    def flush(self):
+        if not self._pending:
+            return False
+        if self.widget is None:
+            self._pending.clear()
+            return False
+
+        chunk = "\n".join(self._pending) + "\n"
+        self._lines += len(self._pending)
+        self._pending.clear()
+
+        state = self.widget.cget('state')
+        self.widget.configure(state='normal')
+        self.widget.insert('end', chunk)
+        excess = self._lines - self.max_lines
+        if excess > 0:
+            self.widget.delete('1.0', f'{excess + 1}.0')
+            self._lines = self.max_lines
+        self.widget.configure(state=state)
+        if self.autoscroll:
+            self.widget.see('end')
+        return True
+
+    # Stop the file writer, flushing what is queued
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+# Simulate a 24 hour shift and check that a flush does not get slower
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import tkinter as tk
+
+    path = os.path.join(tempfile.mkdtemp(), 'ppg.log')
+    try:
+        root = tk.Tk()
+        root.withdraw()
+        text = tk.Text(root)
+        element = type('Element', (), {'Widget': text})()
+    except tk.TclError:
+        element = None  # No display, only the ring and the file are measured
+        print("No display, measuring without the widget")
+
+    panel = LogPanel(element, file_path=path, max_bytes=1024 * 1024)
+    frames_per_hour = 3600 * 20  # 20 fps
+    for hour in range(24):
+        start = time.perf_counter()
+        for frame in range(frames_per_hour):
+            if frame % 20 == 0:  # About one entry per second, like the threshold check
+                panel.log(f"Pulse Normal (hour {hour})")
+            panel.flush()
+        seconds = time.perf_counter() - start
+        if hour in (0, 23):
+            lines = panel._lines
+            print(f"hour {hour:2d}: {seconds / frames_per_hour * 1e6:.2f} us per frame, {lines} lines in the widget")
+    panel.close()
+    print(f"log files: {sorted(os.listdir(os.path.dirname(path)))}")
@@ -0,0 +1,45 @@
+import time
+
+# Frame-rate-capped render scheduler
+#
+# Packet handlers only mark a view dirty; tick() is called once per pass
+# of the GUI loop and redraws each dirty, visible view at most once per
+# frame. Views that are hidden stay dirty and are redrawn when shown, so
+# redraw cost depends on the frame rate, not on how fast packets arrive.
+class RenderScheduler:
+    # Constructor
+    def __init__(self, fps=20):
+        self.interval = 1.0 / fps
+        self.views = {}
+        self.visible = set()
+        self.dirty = set()
+        self._last_frame = 0.0
+
+    # Register a redraw function for a view
+    def add_view(self, name, redraw):
+        self.views[name] = redraw
+
+    # Note that a view's data has changed
+    def mark_dirty(self, name):
+        self.dirty.add(name)
+
+    # Set which views are currently on screen (none while e.g. Info is shown)
+    def show(self, *names):
+        self.visible = set(names)
+        self.dirty.update(names)
+
+    # Timeout for window.read() so the loop wakes up once per frame
+    def timeout_ms(self):
+        return int(self.interval * 1000)
+
+    # Redraw dirty visible views if a frame is due, returns True if anything was drawn
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        due = self.dirty & self.visible
+        if not due or now - self._last_frame < self.interval:
+            return False
+        for name in due:
+            self.views[name]()
+        self.dirty -= due
+        self._last_frame = now
+        return True
@@ -0,0 +1,33 @@
+import importlib
+import threading
+
+# Deferred imports
+#
+# LazyModule stands in for a module and only imports it on first attribute
+# access, so importing ppg does not pay for scipy up front. preload()
+# imports modules on a daemon thread; the GUI scripts start it once their
+# window is up, so the import runs while the GUI is idle instead of
+# stalling the first packet that needs filtering.
+class LazyModule:
+    # Constructor
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    # Import the module on first use and forward the attribute
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# Import modules on a background thread, returns the thread
+def preload(*names):
+    def load():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass  # Raised again where the module is actually used
+    thread = threading.Thread(target=load, name="preload", daemon=True)
+    thread.start()
+    return thread
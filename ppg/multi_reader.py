@@ -0,0 +1,165 @@
+import queue
+import selectors
+import threading
+import time
+
+import serial
+import serial.tools.list_ports
+
+from .packet_stream import PacketStream
+from .pipeline import Pipeline
+from .ring_buffer import RingBuffer
+from .timestamps import monotonic
+
+# Multi-device ingestion on a single I/O thread
+#
+# One MultiDeviceReader thread serves every port. Ports that have a file
+# descriptor (serial ports on Linux/macOS, pseudo terminals) are waited on
+# with a selector; ports without one (Windows COM ports, loop://) are
+# polled through in_waiting on every pass. Whatever is available is read
+# in one call and fed to that port's PacketStream, which turns the bytes
+# into complete packets. Packets are queued as (arrival_time, name, Frame),
+# arrival_time from timestamps.monotonic(),
+# and the GUI drains them once per frame into the per-device DeviceState,
+# so the GUI thread never waits on a port.
+
+# Every serial port on the machine (SharonGUI.get_available_port only returns the first)
+def available_ports():
+    return [port.device for port in serial.tools.list_ports.comports()]
+
+# Background thread reading any number of ports
+class MultiDeviceReader(threading.Thread):
+    # Constructor, ports maps a device name to an open serial port
+    def __init__(self, ports, maxsize=10000, poll_interval=0.01):
+        super().__init__(daemon=True)
+        self.ports = dict(ports)
+        self.streams = {name: PacketStream() for name in self.ports}
+        self.packets = queue.Queue(maxsize)
+        self.poll_interval = poll_interval
+        self.dropped = 0
+        self.errors = {}
+        self.max_cycle = 0.0  # Longest pass over the ports, in seconds
+        self._stop_event = threading.Event()
+
+    # Thread body: wait for data on any port and split it into packets
+    def run(self):
+        selector = selectors.DefaultSelector()
+        polled = []
+        for name, ser in self.ports.items():
+            try:
+                selector.register(ser.fileno(), selectors.EVENT_READ, name)
+            except (AttributeError, OSError, ValueError, serial.SerialException):
+                polled.append(name)  # No selectable descriptor on this platform/port
+
+        while not self._stop_event.is_set() and (selector.get_map() or polled):
+            timeout = self.poll_interval if polled else 0.5
+            if selector.get_map():
+                ready = [key.data for key, _ in selector.select(timeout)]
+            else:
+                ready = []
+                self._stop_event.wait(timeout)
+            start = time.perf_counter()
+            now = monotonic()
+            for name in ready:
+                if not self._read(name, now):
+                    selector.unregister(self.ports[name].fileno())
+            for name in list(polled):
+                if not self._read(name, now, poll=True):
+                    polled.remove(name)
+            self.max_cycle = max(self.max_cycle, time.perf_counter() - start)
+        selector.close()
+
+    # Read what one port has, returns False if the port failed
+    def _read(self, name, now, poll=False):
+        ser = self.ports[name]
+        try:
+            waiting = ser.in_waiting
+            if poll and not waiting:
+                return True
+            data = ser.read(waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self.errors[name] = e
+            return False
+        for packet in self.streams[name].feed(data):
+            self._put((now, name, packet))
+        return True
+
+    # Queue a packet, dropping the oldest one if the GUI has fallen behind
+    def _put(self, item):
+        while True:
+            try:
+                self.packets.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.packets.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    # Return all queued (arrival_time, name, Frame) tuples without blocking
+    def drain(self, max_items=None):
+        items = []
+        while max_items is None or len(items) < max_items:
+            try:
+                items.append(self.packets.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    # Ask the thread to stop, it exits within one select timeout
+    def stop(self):
+        self._stop_event.set()
+
+# Per-device state kept by the dashboard
+class DeviceState:
+    # Constructor
+    def __init__(self, name, fs=50, capacity=250):
+        self.name = name
+        self.samples = RingBuffer(capacity)
+        self.pipeline = Pipeline(fs)
+        self.hr_estimator = self.pipeline.hr_estimator
+        self.alarm = self.pipeline.alarm
+        self.sequence = self.pipeline.sequence
+        self.heart_rate = None
+        self.threshold = None
+        self.packets = 0
+        self.last_packet_time = None
+
+    # Apply one packet
+    def update(self, arrival_time, frame):
+        reading = self.pipeline.process(frame, arrival_time)
+        self.samples.extend(reading.samples)
+        self.heart_rate = reading.heart_rate
+        self.threshold = reading.threshold
+        self.packets += 1
+        self.last_packet_time = arrival_time
+
+# Run dozens of simulated devices through one reader and check it keeps up
+if __name__ == '__main__':
+    from .device_simulator import DeviceSimulator
+
+    devices, speed, seconds = 48, 10, 5.0
+    simulators = [DeviceSimulator(speed=speed, seed=i) for i in range(devices)]
+    ports = {f"sim{i}": serial.Serial(sim.open_pty(), timeout=0) for i, sim in enumerate(simulators)}
+    states = {name: DeviceState(name) for name in ports}
+    reader = MultiDeviceReader(ports)
+    reader.start()
+
+    start = time.perf_counter()
+    apply_time = 0.0
+    while time.perf_counter() - start < seconds:
+        time.sleep(0.05)  # One GUI frame
+        t = time.perf_counter()
+        for arrival_time, name, frame in reader.drain():
+            states[name].update(arrival_time, frame)
+        apply_time += time.perf_counter() - t
+    reader.stop()
+    for sim in simulators:
+        sim.stop()
+
+    sent = sum(sim.sent for sim in simulators)
+    received = sum(state.packets for state in states.values())
+    print(f"{devices} devices at {speed}x: {received}/{sent} packets received, "
+          f"{reader.dropped} dropped, longest I/O pass {reader.max_cycle * 1e3:.2f} ms, "
+          f"GUI-side apply {apply_time / seconds * 100:.1f}% of one core")
@@ -0,0 +1,77 @@
+import re
+
+import numpy as np
+
+# Bulk parser for the comma separated sample payload of an "R," line
+#
+# The firmware writes every sample as "%4d," so the payload looks like
+# " 812,1903,2044,...". parse_samples() converts the whole payload in one
+# np.fromstring call, which already skips the padding spaces and accepts a
+# trailing comma. np.fromstring reads a blank field as 0, so payloads with
+# empty or all-space fields go straight to the fallback; so does anything
+# it does not account for field by field (stray characters or split
+# digits from a corrupted line). The fallback keeps the fields that are
+# plain numbers and drops the rest. Only corrupted lines take it.
+_BLANK_FIELD = re.compile(r'^\s*,|,\s*,')
+
+# Parse an "R," payload (str or bytes, without the "R," tag) into an int array
+def parse_samples(payload):
+    if not isinstance(payload, str):
+        payload = bytes(payload).decode('ascii', errors='replace')
+    if _BLANK_FIELD.search(payload):
+        return _parse_fallback(payload)
+    try:
+        values = np.fromstring(payload, dtype=np.int64, sep=',')
+    except ValueError:
+        # Newer NumPy raises on unparsable data, older versions stop early
+        return _parse_fallback(payload)
+    if values.size == _field_count(payload):
+        return values
+    return _parse_fallback(payload)
+
+# Number of fields np.fromstring should have produced
+def _field_count(payload):
+    stripped = payload.rstrip()
+    if not stripped:
+        return 0
+    return stripped.count(',') + (0 if stripped.endswith(',') else 1)
+
+# Per-field parser, dropping malformed fields ("x", "abc3", "8 12")
+def _parse_fallback(payload):
+    if not isinstance(payload, str):
+        payload = bytes(payload).decode('ascii', errors='replace')
+    fields = [field.strip() for field in payload.split(",")]
+    return np.array([int(field) for field in fields if field.isascii() and field.isdigit()], dtype=np.int64)
+
+# Old per-element parser, kept for the benchmark
+def _parse_per_element(payload):
+    return [int(val.strip()) for val in payload.split(",")]
+
+# Benchmark the fast path and the fallback against the per-element parser
+if __name__ == '__main__':
+    import timeit
+
+    rng = np.random.default_rng(0)
+    samples = rng.integers(0, 4096, 50)
+    payload = ",".join(f"{v:4d}" for v in samples)
+    malformed = payload + ",,'x1',"
+
+    assert np.array_equal(parse_samples(payload), samples)
+    assert np.array_equal(parse_samples(payload + ","), samples)
+    assert np.array_equal(_parse_fallback(payload), samples)
+    assert np.array_equal(parse_samples(malformed), samples)
+    assert np.array_equal(parse_samples(" 812, 8 12,900,"), [812, 900])
+    assert np.array_equal(parse_samples("812, ,900"), [812, 900])
+    assert np.array_equal(parse_samples("    ,1903"), [1903])
+    assert np.array_equal(parse_samples("812,   ,900,"), [812, 900])
+
+    runs = 20000
+    for name, func, data in [
+        ("per-element (old)", _parse_per_element, payload),
+        ("parse_samples fast path", parse_samples, payload),
+        ("parse_samples fallback", parse_samples, malformed),
+        ("per-element x20 payload", _parse_per_element, ",".join([payload] * 20)),
+        ("fast path x20 payload", parse_samples, ",".join([payload] * 20)),
+    ]:
+        seconds = timeit.timeit(lambda: func(data), number=runs)
+        print(f"{name:26s} {seconds / runs * 1e6:8.2f} us per packet")
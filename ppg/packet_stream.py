@@ -0,0 +1,179 @@
+from .binary_protocol import HEADER, SYNC, Frame, decode_frame, frame_size
+from .packet_parser import parse_samples
+from .timestamps import monotonic
+
+# Self-synchronizing packet assembler for one port
+#
+# Binary frames are found by their sync bytes and checked by their CRC.
+# Text packets are assembled line by line from their record tags:
+#
+#   R,<samples>  starts a packet, H,<bpm> and T,<threshold> fill it in,
+#   S,<seq>      ends it
+#
+# The legacy untagged firmware (readPulse_basic.ino) sends a line of comma
+# separated samples, a float BPM line and an integer threshold line; its
+# packets start at a line with commas and end at the threshold line. The
+# single-line format read by GUI_latest_version ("72.5, 812,1903,...", the
+# BPM with its decimal point followed by the samples) is a whole packet.
+#
+# Nothing depends on counting lines. A line that does not fit the packet
+# being assembled (H/T/S, or a bare number, with no samples line before
+# it, as after a lost line or a reconnect mid-packet) is dropped as
+# stray, and a packet still incomplete `timeout` seconds after its samples
+# line is dropped, so a lost line costs at most one packet. A tagged
+# packet whose S line was lost still goes out, without a sequence number,
+# when the next R line arrives if it has its H and T values.
+#
+# The packet being assembled lives in a few fixed slots, so every line is
+# handled in constant time and only the samples array is allocated.
+class PacketStream:
+    MAX_LINE = 4096  # A line longer than this is garbage, drop it
+    TAGGED = "tagged"
+    LEGACY = "legacy"
+
+    # Constructor
+    def __init__(self, timeout=1.0):
+        self.buffer = bytearray()
+        self.timeout = timeout
+        self.bad_frames = 0
+        self.incomplete = 0  # Partial packets dropped
+        self.stray = 0  # Lines that did not belong to any packet
+        self._clear()
+
+    # Forget the packet being assembled
+    def _clear(self):
+        self._kind = None  # None, TAGGED or LEGACY
+        self._started = 0.0
+        self._samples = None
+        self._heart_rate = None
+        self._threshold = None
+
+    # Add received bytes, returns the packets they completed
+    def feed(self, data, now=None):
+        now = monotonic() if now is None else now
+        self.buffer += data
+        packets = []
+        while self.buffer:
+            if self.buffer[0] == SYNC[0]:
+                if len(self.buffer) < HEADER.size:
+                    break
+                size = frame_size(self.buffer[HEADER.size - 1])
+                if self.buffer[1] != SYNC[1]:
+                    size = 0
+                elif len(self.buffer) < size:
+                    break
+                try:
+                    packets.append(decode_frame(self.buffer[:size]))
+                    del self.buffer[:size]
+                except ValueError:
+                    self.bad_frames += 1
+                    del self.buffer[:1]  # Resynchronize on the next byte
+                continue
+
+            end = self.buffer.find(b'\n')
+            if end < 0:
+                if len(self.buffer) > self.MAX_LINE:
+                    self.buffer.clear()
+                break
+            line = self.buffer[:end].decode('utf-8', errors='replace').strip()
+            del self.buffer[:end + 1]
+            packet = self.add_line(line, now)
+            if packet is not None:
+                packets.append(packet)
+        return packets
+
+    # Add one text line (without its newline), returns a Frame when it completes a packet
+    def add_line(self, line, now=None):
+        if not line:
+            return None  # The firmware's blank line after the samples
+        now = monotonic() if now is None else now
+        if self._kind is not None and now - self._started > self.timeout:
+            self.incomplete += 1
+            self._clear()
+
+        tag = line[:2]
+        try:
+            if tag == "R,":
+                return self._start(self.TAGGED, line[2:], now)
+            if tag == "H,":
+                if self._kind == self.TAGGED:
+                    self._heart_rate = float(line[2:])
+                    return None
+            elif tag == "T,":
+                if self._kind == self.TAGGED:
+                    self._threshold = int(line[2:])
+                    return None
+            elif tag == "S,":
+                if self._kind == self.TAGGED:
+                    return self._finish(int(line[2:]))
+            elif "," in line:
+                line = line.strip("'\"")
+                heart_rate, _, samples = line.partition(",")
+                if "." in heart_rate:
+                    packet = Frame(None, parse_samples(samples), float(heart_rate), None)
+                    if self._kind is not None:
+                        self.incomplete += 1
+                        self._clear()
+                    return packet
+                return self._start(self.LEGACY, line, now)
+            elif self._kind == self.LEGACY:
+                if "." not in line:
+                    self._threshold = int(line)
+                    return self._finish(None)
+                if self._heart_rate is None:
+                    self._heart_rate = float(line)
+                    return None
+        except ValueError:
+            pass  # Malformed value, the packet goes out without it
+        self.stray += 1
+        return None
+
+    # Start a packet at its samples line, putting out a tagged packet that only lost its S line
+    def _start(self, kind, payload, now):
+        packet = None
+        if self._kind == self.TAGGED and self._heart_rate is not None and self._threshold is not None:
+            packet = Frame(None, self._samples, self._heart_rate, self._threshold)
+        elif self._kind is not None:
+            self.incomplete += 1
+        self._kind = kind
+        self._started = now
+        self._samples = parse_samples(payload)
+        self._heart_rate = None
+        self._threshold = None
+        return packet
+
+    # Complete the packet being assembled
+    def _finish(self, seq):
+        packet = Frame(seq, self._samples, self._heart_rate, self._threshold)
+        self._clear()
+        return packet
+
+# Compare resynchronization with fixed three-line grouping and time add_line()
+if __name__ == '__main__':
+    import random
+    import timeit
+
+    from .device_simulator import DeviceSimulator
+
+    simulator = DeviceSimulator(speed=None, seed=0)
+    tagged = [line for _ in range(1000) for line in simulator.next_packet().decode().split("\n") if line]
+    legacy = [line[2:] for line in tagged if not line.startswith("S,")]  # readPulse_basic.ino format
+
+    rng = random.Random(0)
+    for name, lines in [("tagged", tagged), ("legacy", legacy)]:
+        lossy = [line for line in lines if rng.random() > 0.01]  # Lose 1% of the lines
+        stream = PacketStream()
+        packets = [packet for line in lossy if (packet := stream.add_line(line, 0.0)) is not None]
+        good = sum(1 for packet in packets if packet.samples.size == 50 and packet.threshold is not None)
+
+        # The old SharonGUI grouping of the legacy format: any three non-empty lines are one packet
+        groups = [lossy[i:i + 3] for i in range(0, len(lossy) - 2, 3)]
+        aligned = sum(1 for group in groups if "," in group[0] and "," not in group[1] + group[2])
+        grouping = f" (three-line grouping: {aligned} aligned)" if name == "legacy" else ""
+
+        runs = len(lines)
+        it = iter(lines * 2)
+        stream = PacketStream()
+        seconds = timeit.timeit(lambda: stream.add_line(next(it), 0.0), number=runs)
+        print(f"{name}: {len(lines) - len(lossy)} lines lost, {good}/1000 packets assembled{grouping}, "
+              f"{seconds / runs * 1e6:.2f} us per line")
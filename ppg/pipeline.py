@@ -0,0 +1,107 @@
+from collections import namedtuple
+
+from .alarm_engine import AlarmEngine
+from .binary_protocol import Frame
+from .hr_estimator import HeartRateEstimator
+from .packet_stream import PacketStream
+from .sequence_tracker import SequenceTracker
+from .stream_filter import StreamingLPF
+from .timestamps import monotonic
+
+# Headless processing pipeline: source -> parser -> filter -> HR -> alarm
+#
+#   source   bytes from a serial port, a ReplayPort or a DeviceSimulator,
+#            either read here (run) or by a SerialReader thread (process_items)
+#   parser   PacketStream turns bytes and text lines into Frames,
+#            resynchronizing on every packet start
+#   filter   StreamingLPF on the new samples only
+#   HR       HeartRateEstimator; the device's value is used until it has
+#            enough samples
+#   alarm    AlarmEngine, only fed estimates the spectrum confirms
+#
+# Every packet comes out as one Reading, so a GUI only has to display it
+# and the whole chain can run without Tk or matplotlib, at full speed.
+Reading = namedtuple('Reading', ['time', 'seq', 'samples', 'filtered', 'heart_rate', 'device_heart_rate',
+                                 'threshold', 'confirmed', 'sequence_event', 'alarm'])
+
+class Pipeline:
+    # Constructor, recorder is an optional SessionRecorder that gets every packet
+    def __init__(self, fs=50, cutoff=2.5, low=60, high=100, max_device_bpm=120, recorder=None):
+        self.fs = fs
+        self.max_device_bpm = max_device_bpm  # Device values above this are ignored
+        self.lowpass = StreamingLPF(cutoff, fs)
+        self.hr_estimator = HeartRateEstimator(fs)
+        self.alarm = AlarmEngine(low, high)
+        self.sequence = SequenceTracker()
+        self.stream = PacketStream()
+        self.recorder = recorder
+        self.heart_rate = None
+        self.packets = 0
+
+    # Forget the signal history (e.g. after a reconnect), keeps the alarm and sequence state
+    def reset(self):
+        self.lowpass.reset()
+        self.hr_estimator.reset()
+        self.stream = PacketStream()
+
+    # Run one packet through the filter, heart rate and alarm stages
+    def process(self, frame, arrival_time=None):
+        arrival_time = monotonic() if arrival_time is None else arrival_time
+        if self.recorder is not None:
+            self.recorder.record(arrival_time, frame)
+
+        filtered = self.lowpass.process(frame.samples)
+        bpm = self.hr_estimator.update(frame.samples)
+        alarm = None
+        if bpm is not None:
+            self.heart_rate = bpm
+            alarm = self.alarm.evaluate(bpm, arrival_time, quality=self.hr_estimator.confirmed)
+        elif frame.heart_rate is not None and frame.heart_rate <= self.max_device_bpm:
+            self.heart_rate = frame.heart_rate
+
+        sequence_event = self.sequence.update(frame.seq) if frame.seq is not None else None
+        self.packets += 1
+        return Reading(arrival_time, frame.seq, frame.samples, filtered, self.heart_rate, frame.heart_rate,
+                       frame.threshold, self.hr_estimator.confirmed, sequence_event, alarm)
+
+    # Process raw bytes, returns the Readings of the packets they completed
+    def feed(self, data, arrival_time=None):
+        return [self.process(frame, arrival_time) for frame in self.stream.feed(data, arrival_time)]
+
+    # Process the (arrival_time, item) pairs of SerialReader.drain(), items are Frames or text lines
+    def process_items(self, items):
+        readings = []
+        for arrival_time, item in items:
+            frame = item if isinstance(item, Frame) else self.stream.add_line(item, arrival_time)
+            if frame is not None:
+                readings.append(self.process(frame, arrival_time))
+        return readings
+
+    # Read a port on the calling thread and yield Readings until a read times out
+    def run(self, port, chunk_size=4096):
+        while True:
+            data = port.read(max(1, min(port.in_waiting, chunk_size)))
+            if not data:
+                return
+            yield from self.feed(data)
+
+# Run simulated packets through the whole pipeline as fast as it goes
+if __name__ == '__main__':
+    import time
+
+    import scipy.signal  # Loaded up front so the timing only covers processing
+
+    from .device_simulator import DeviceSimulator
+
+    for binary in (False, True):
+        simulator = DeviceSimulator(heart_rate=110, speed=None, binary=binary, seed=0)
+        packets = [simulator.next_packet() for _ in range(600)]  # Ten minutes of packets
+        pipeline = Pipeline()
+        start = time.perf_counter()
+        readings = []
+        for second, packet in enumerate(packets):
+            readings += pipeline.feed(packet, arrival_time=float(second))  # Device time, not wall time
+        seconds = time.perf_counter() - start
+        alarms = [(reading.seq, reading.alarm) for reading in readings if reading.alarm]
+        print(f"{'binary' if binary else 'text':6s}: {len(readings)} packets in {seconds * 1e3:.0f} ms "
+              f"({len(readings) / seconds:.0f} packets/s), last BPM {pipeline.heart_rate:.1f}, alarms {alarms}")
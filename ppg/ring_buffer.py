@@ -0,0 +1,60 @@
+import numpy as np
+
+# Fixed-capacity ring buffer backed by a preallocated NumPy array
+#
+# Every sample is written twice, at i and i + capacity, so the latest N
+# samples are always one contiguous slice. latest() can then hand back a
+# read-only view without copying, and extend() costs O(k) in the number
+# of new samples no matter how full the buffer is.
+class RingBuffer:
+    # Constructor
+    def __init__(self, capacity, dtype=float):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0  # Next write position in [0, capacity)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    # Drop all samples (the storage is kept)
+    def clear(self):
+        self._head = 0
+        self._count = 0
+
+    # Append a single value
+    def append(self, value):
+        self.extend((value,))
+
+    # Append many values at once
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype).ravel()
+        n = values.size
+        if n == 0:
+            return
+        if n > self.capacity:
+            values = values[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        head = self._head
+        first = min(n, cap - head)
+        self._data[head:head + first] = values[:first]
+        self._data[head + cap:head + cap + first] = values[:first]
+        rest = n - first
+        if rest:
+            self._data[:rest] = values[first:]
+            self._data[cap:cap + rest] = values[first:]
+
+        self._head = (head + n) % cap
+        self._count = min(self._count + n, cap)
+
+    # Zero-copy, read-only view of the latest n samples (all of them by default)
+    def latest(self, n=None):
+        n = self._count if n is None else min(n, self._count)
+        end = self._head + self.capacity
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,161 @@
+from collections import deque
+
+# Packet sequence tracking
+#
+# Keeps a sliding bitmap of the last `window` sequence numbers below the
+# highest one seen (bit i set = packet head - i was received). Sequence
+# numbers are compared modulo `modulus` (the binary frame's uint16), so
+# wraparound is just a step forward. A packet that arrives below the head
+# but inside the bitmap is a late (reordered) packet, or a duplicate if its
+# bit is already set. The firmware restarts at 1 after a reboot, so these
+# start a new epoch instead of being reported as loss or duplicates:
+#   - a jump back by more than `max_reorder`, or out of the bitmap
+#   - a jump forward by more than `window` (a reboot after more than half
+#     the modulus, which would otherwise count as a huge gap)
+#   - a jump back to a number below the reorder depth before the sequence
+#     has wrapped (e.g. 1..20 then 1, a reboot in the first packets)
+#
+# Loss, reorder depth and duplicates are reported both as totals and over
+# the last `window` sequence numbers / arrivals.
+class SequenceTracker:
+    # Constructor
+    def __init__(self, window=256, max_reorder=32, modulus=1 << 16):
+        self.window = window
+        self.max_reorder = max_reorder
+        self.modulus = modulus
+        self._full_mask = (1 << window) - 1
+        self.clear()
+
+    # Forget everything
+    def clear(self):
+        self.head = None
+        self.bitmap = 0
+        self.span = 0  # Sequence numbers covered by the bitmap in this epoch
+        self.wrapped = False  # The sequence has wrapped around in this epoch
+        self.expected = 0
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.resets = 0
+        self.max_depth = 0
+        self.arrivals = deque(maxlen=self.window)  # Per arrival: reorder depth, -1 for a duplicate
+
+    # Record a sequence number, returns "first", "in_order", "gap", "late", "duplicate" or "reset"
+    def update(self, seq):
+        seq %= self.modulus
+        if self.head is None:
+            self._start(seq)
+            return "first"
+
+        step = (seq - self.head) % self.modulus
+        if step > self.modulus // 2:
+            step -= self.modulus  # Behind the head
+
+        if step > self.window:
+            return self._reset(seq)
+        if step > 0:
+            if seq < self.head:
+                self.wrapped = True
+            self.expected += step
+            self.received += 1
+            self.bitmap = ((self.bitmap << step) | 1) & self._full_mask
+            self.span = min(self.window, self.span + step)
+            self.head = seq
+            self.arrivals.append(0)
+            return "in_order" if step == 1 else "gap"
+
+        depth = -step
+        if depth > self.max_reorder or depth >= self.span or (not self.wrapped and seq < depth):
+            return self._reset(seq)
+        bit = 1 << depth
+        if self.bitmap & bit:
+            self.duplicates += 1
+            self.arrivals.append(-1)
+            return "duplicate"
+        self.bitmap |= bit
+        self.received += 1
+        self.reordered += 1
+        self.max_depth = max(self.max_depth, depth)
+        self.arrivals.append(depth)
+        return "late"
+
+    # Count a device reset and begin a new epoch at seq
+    def _reset(self, seq):
+        self.resets += 1
+        self._start(seq)
+        return "reset"
+
+    # Begin a new epoch at seq
+    def _start(self, seq):
+        self.head = seq
+        self.bitmap = 1
+        self.span = 1
+        self.wrapped = False
+        self.expected += 1
+        self.received += 1
+        self.arrivals.append(0)
+
+    # Packets that never arrived (so far)
+    @property
+    def lost(self):
+        return self.expected - self.received
+
+    # Fraction of the last `window` sequence numbers that are missing
+    def loss_rate(self):
+        if self.span == 0:
+            return 0.0
+        received = bin(self.bitmap & ((1 << self.span) - 1)).count('1')
+        return 1.0 - received / self.span
+
+    # Rolling and total statistics
+    def metrics(self):
+        recent = list(self.arrivals)
+        return {
+            'last_seq': self.head,
+            'received': self.received,
+            'lost': self.lost,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'resets': self.resets,
+            'loss_rate': self.loss_rate(),
+            'reorder_depth': max(recent, default=0),
+            'recent_duplicates': recent.count(-1),
+            'max_reorder_depth': self.max_depth,
+        }
+
+    # One-line summary for a status panel
+    def status(self):
+        if self.head is None:
+            return "No packets yet"
+        m = self.metrics()
+        return (f"Seq {m['last_seq']} | loss {m['loss_rate']:.1%} (last {self.span}), {m['lost']} total"
+                f" | reorder depth {m['reorder_depth']} | dup {m['recent_duplicates']} | resets {m['resets']}")
+
+# Check the edge cases and time the per-packet cost
+if __name__ == '__main__':
+    import timeit
+
+    tracker = SequenceTracker(window=16, max_reorder=4)
+    events = [tracker.update(s) for s in [1, 2, 3, 5, 4, 4, 6, 9, 1, 2]]
+    assert events == ["first", "in_order", "in_order", "gap", "late", "duplicate", "in_order", "gap", "reset", "in_order"], events
+    assert (tracker.lost, tracker.duplicates, tracker.reordered, tracker.resets) == (2, 1, 1, 1)
+
+    tracker = SequenceTracker()
+    assert [tracker.update(s) for s in [65534, 65535, 0, 1]] == ["first", "in_order", "in_order", "in_order"]
+
+    # Reboots in the first packets and after more than half the modulus
+    tracker = SequenceTracker()
+    events = [tracker.update(s) for s in list(range(1, 21)) + list(range(1, 25))]
+    assert events.count("reset") == 1 and "duplicate" not in events and "late" not in events, events
+    assert (tracker.lost, tracker.resets) == (0, 1)
+    tracker = SequenceTracker()
+    events = [tracker.update(s) for s in [40007, 40008, 40009, 1, 2]]
+    assert events == ["first", "in_order", "in_order", "reset", "in_order"], events
+    assert tracker.lost == 0
+    print(tracker.status())
+
+    tracker = SequenceTracker()
+    seqs = iter(range(10 ** 7))
+    runs = 100000
+    seconds = timeit.timeit(lambda: tracker.update(next(seqs)), number=runs)
+    print(f"{seconds / runs * 1e6:.2f} us per packet")
@@ -0,0 +1,155 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+
+import serial
+
+from .serial_reader import SerialReader
+
+# Self-healing serial link
+#
+# An asyncio supervisor, running on its own thread, opens the port, hands
+# it to a SerialReader and waits for the reader to exit. When the port
+# cannot be opened or fails, it retries after an exponential backoff with
+# jitter: the delay doubles from min_delay up to max_delay, and the second
+# half of each delay is random so devices that dropped at the same moment
+# do not all retry in lockstep.
+#
+# The GUI never waits on the port: received lines are collected in one
+# queue that survives reconnects (drain()), and changes of link state are
+# reported as (time, state, message) events (drain_events()). The states
+# are "connecting", "connected" and "disconnected".
+class SerialLink(threading.Thread):
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    DISCONNECTED = "disconnected"
+
+    # Constructor, open_port can replace serial.Serial (e.g. a replay or a simulator)
+    def __init__(self, port=None, baud_rate=115200, timeout=1, maxsize=1000,
+                 min_delay=0.5, max_delay=30.0, open_port=None):
+        super().__init__(daemon=True)
+        self.port = port
+        self.open_port = open_port or (lambda: serial.Serial(port, baud_rate, timeout=timeout))
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.lines = queue.Queue(maxsize)
+        self.events = queue.Queue()
+        self.state = self.DISCONNECTED
+        self.attempts = 0  # Failed attempts since the last successful connect
+        self.reader = None
+        self._dropped = 0
+        self._loop = None
+        self._stopping = None
+
+    # Lines dropped because the GUI fell behind, over all connections
+    @property
+    def dropped(self):
+        return self._dropped + (self.reader.dropped if self.reader is not None else 0)
+
+    # Thread body: run the supervisor until stop() is called
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        self._stopping = asyncio.Event()
+        try:
+            self._loop.run_until_complete(self._supervise())
+        finally:
+            self._loop.close()
+
+    # Connect, wait for the connection to fail, back off and reconnect
+    async def _supervise(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            self._set_state(self.CONNECTING, f"Connecting to {self.port or 'device'}...")
+            try:
+                ser = await loop.run_in_executor(None, self.open_port)
+            except (serial.SerialException, OSError) as e:
+                delay = self.backoff(self.attempts)
+                self.attempts += 1
+                self._set_state(self.DISCONNECTED, f"Connection failed ({e}), retrying in {delay:.1f} s")
+                await self._sleep(delay)
+                continue
+
+            self.attempts = 0
+            if self.reader is not None:
+                self._dropped += self.reader.dropped
+            self.reader = SerialReader(ser, lines=self.lines)
+            self.reader.start()
+            self._set_state(self.CONNECTED, f"Connected to {self.port or 'device'}")
+
+            # The reader thread exits when the port fails
+            while self.reader.is_alive() and not self._stopping.is_set():
+                await self._sleep(0.1)
+            self.reader.stop()
+            await loop.run_in_executor(None, ser.close)
+            if not self._stopping.is_set():
+                self._set_state(self.DISCONNECTED, f"Connection lost ({self.reader.error}), reconnecting...")
+
+    # Delay before the given retry: exponential with the upper half jittered
+    def backoff(self, attempt):
+        delay = min(self.max_delay, self.min_delay * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    # Sleep that ends early when the link is stopped
+    async def _sleep(self, delay):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    # Record a change of link state for the GUI
+    def _set_state(self, state, message):
+        self.state = state
+        self.events.put((time.time(), state, message))
+
+    # Return all (arrival_time, line) pairs received since the last call
+    def drain(self, max_items=None):
+        items = []
+        while max_items is None or len(items) < max_items:
+            try:
+                items.append(self.lines.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    # Return all (time, state, message) link events since the last call
+    def drain_events(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    # Stop reconnecting and close the port
+    def stop(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self.reader is not None:
+            self.reader.stop()
+
+# Show the backoff schedule and a reconnect against a port that keeps failing
+if __name__ == '__main__':
+    link = SerialLink(min_delay=0.5, max_delay=30.0)
+    print("Retry delays:", ", ".join(f"{link.backoff(n):.1f}" for n in range(8)))
+
+    attempts = []
+
+    def flaky_open():
+        attempts.append(time.monotonic())
+        if len(attempts) < 4:
+            raise serial.SerialException("port busy")
+        return serial.serial_for_url('loop://', timeout=0.1)
+
+    link = SerialLink('loop://', open_port=flaky_open, min_delay=0.05, max_delay=1.0)
+    link.start()
+    while link.state != SerialLink.CONNECTED:
+        time.sleep(0.01)
+    link.reader.ser.write(b"S,1\n")
+    time.sleep(0.3)
+    print("Received:", [line for _, line in link.drain()])
+    for when, state, message in link.drain_events():
+        print(f"  {state:12s} {message}")
+    link.stop()
+    link.join()
@@ -0,0 +1,188 @@
+import queue
+import threading
+
+import serial
+
+from .binary_protocol import HEADER, SYNC, decode_frame, frame_size
+from .timestamps import monotonic
+
+# Background thread that drains a serial port into a bounded queue
+#
+# The thread only reads and timestamps lines; it never touches the GUI, so
+# a slow redraw can not hold up the port. When the queue is full the
+# oldest line is dropped (the newest data matters most for a monitor) and
+# counted in `dropped`. The GUI loop calls drain() once per frame. Arrival
+# times come from timestamps.monotonic(), so clock changes do not affect them.
+#
+# Queued items are text lines, or binary_protocol.Frame tuples when the
+# firmware sends binary frames; the format is detected from the first byte.
+#
+# The port is read in chunks of whatever has arrived (at least one byte)
+# into one bytearray that is kept for the life of the reader, and items
+# are split off it with bytes.find() and a memoryview, so there is no
+# per-byte Python work (readline() reads one byte per call). A partial
+# line simply waits in the buffer for the rest of it. The port's timeout
+# is capped at read_timeout, so a read never blocks for long even when the
+# port was opened with timeout=100, and stop() always takes effect.
+class SerialReader(threading.Thread):
+    CHUNK_SIZE = 4096
+    MAX_LINE = 4096  # A line longer than this is garbage, drop it
+    READ_TIMEOUT = 0.1
+
+    # Constructor, lines can be an existing queue to keep using across reconnects
+    def __init__(self, ser, maxsize=1000, lines=None, read_timeout=READ_TIMEOUT):
+        super().__init__(daemon=True)
+        self.ser = ser
+        if not ser.timeout or ser.timeout > read_timeout:
+            ser.timeout = read_timeout  # None blocks forever and 0 would spin
+        self.lines = queue.Queue(maxsize) if lines is None else lines
+        self.dropped = 0
+        self.bad_frames = 0
+        self.error = None
+        self._buffer = bytearray()
+        self._stop_event = threading.Event()
+
+    # Thread body: read until stopped or the port fails
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                data = self.ser.read(min(self.ser.in_waiting, self.CHUNK_SIZE) or 1)
+            except (serial.SerialException, OSError) as e:
+                self.error = e
+                break
+            if not data:
+                continue  # Read timed out
+            arrival_time = monotonic()
+            for item in self._split(data):
+                self._put((arrival_time, item))
+
+    # Add received bytes to the buffer and split off the complete lines and frames
+    def _split(self, data):
+        buffer = self._buffer
+        buffer += data
+        items = []
+        start = 0
+        size = len(buffer)
+        with memoryview(buffer) as view:
+            while start < size:
+                if buffer[start] == SYNC[0]:
+                    if size - start < HEADER.size:
+                        break
+                    end = start + frame_size(buffer[start + HEADER.size - 1])
+                    if end > size and buffer[start + 1] == SYNC[1]:
+                        break
+                    try:
+                        items.append(decode_frame(view[start:end]))
+                        start = end
+                    except ValueError:
+                        self.bad_frames += 1
+                        start += 1  # Resynchronize on the next byte
+                    continue
+
+                end = buffer.find(b'\n', start)
+                if end < 0:
+                    if size - start > self.MAX_LINE:
+                        start = size
+                    break
+                items.append(str(view[start:end], 'utf-8', 'replace').strip())
+                start = end + 1
+        del buffer[:start]
+        return items
+
+    # Queue a line, dropping the oldest one if the GUI has fallen behind
+    def _put(self, item):
+        while True:
+            try:
+                self.lines.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.lines.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    # Return all queued (arrival_time, line) pairs without blocking
+    def drain(self, max_items=None):
+        items = []
+        while max_items is None or len(items) < max_items:
+            try:
+                items.append(self.lines.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    # Ask the thread to stop and wake it up if it is blocked in a read
+    def stop(self):
+        self._stop_event.set()
+        cancel_read = getattr(self.ser, 'cancel_read', None)
+        if cancel_read is not None:
+            cancel_read()
+
+# Compare chunked reads with the previous read(1) + readline() path
+if __name__ == '__main__':
+    import io
+    import time
+
+    from .binary_protocol import read_frame
+    from .device_simulator import DeviceSimulator
+
+    # Port stand-in holding all the data up front; readline() comes from io.RawIOBase
+    # and, like pyserial's, reads one byte per call
+    class LoopbackPort(io.RawIOBase):
+        # Constructor
+        def __init__(self, data):
+            self.data = memoryview(data)
+            self.position = 0
+            self.timeout = 0.1
+
+        # Number of bytes left
+        @property
+        def in_waiting(self):
+            return len(self.data) - self.position
+
+        # Required by io.RawIOBase
+        def readable(self):
+            return True
+
+        # Copy up to len(b) bytes into b
+        def readinto(self, b):
+            n = min(len(b), self.in_waiting)
+            b[:n] = self.data[self.position:self.position + n]
+            self.position += n
+            return n
+
+    # The reader's previous _read_item() loop
+    def readline_items(port):
+        items = []
+        while True:
+            first = port.read(1)
+            if not first:
+                return items
+            if first == SYNC[:1]:
+                items.append(read_frame(port))
+            elif first == b'\n':
+                items.append('')
+            else:
+                items.append((first + port.readline()).decode('utf-8', errors='replace').strip())
+
+    for binary in (False, True):
+        simulator = DeviceSimulator(speed=None, binary=binary, seed=0)
+        data = b''.join(simulator.next_packet() for _ in range(2000))
+
+        start = time.perf_counter()
+        expected = len(readline_items(LoopbackPort(data)))
+        readline_seconds = time.perf_counter() - start
+
+        reader = SerialReader(LoopbackPort(data), maxsize=0)
+        start = time.perf_counter()
+        reader.start()
+        while reader.lines.qsize() < expected:
+            time.sleep(0.0005)
+        chunked_seconds = time.perf_counter() - start
+        reader.stop()
+
+        print(f"{'binary' if binary else 'text':6s}: {len(data) / 1e6:.1f} MB, {expected} items, "
+              f"readline {len(data) / readline_seconds / 1e6:.1f} MB/s, "
+              f"chunked {len(data) / chunked_seconds / 1e6:.1f} MB/s "
+              f"({readline_seconds / chunked_seconds:.0f}x)")
@@ -0,0 +1,227 @@
+import mmap
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .binary_protocol import HEADER, SYNC, Frame, decode_frame, encode_frame, frame_size
+from .packet_stream import PacketStream
+from .timestamps import wall_time
+
+# Session recording and replay
+#
+# A recording is an append-only file: an 8 byte magic followed by one
+# record per packet. A record is the arrival time (float64, seconds since
+# the epoch) followed by the packet encoded as a binary_protocol frame, so
+# every record carries its own length and CRC. Nothing is ever rewritten,
+# so a crash loses at most the packet being written. Readers stop at a
+# record without sync bytes (a zero-filled or garbled tail, whose length
+# byte cannot be trusted) and skip records that fail their CRC check, so
+# a damaged recording still yields every packet before the damage.
+#
+# ReplayPort memory-maps a recording and serves the frames with the
+# original timing (scaled by `speed`) through the read()/readline()
+# interface of serial.Serial. A GUI script can use it in place of the real
+# port and the packets go through the same SerialReader and handlers.
+MAGIC = b'PPGREC1\n'
+TIMESTAMP = struct.Struct('<d')
+
+# Writes every packet of a session to a recording
+class SessionRecorder:
+    # Constructor
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.count = 0
+        self._stream = PacketStream()  # Assembles text lines into packets
+
+    # Record an item from SerialReader.drain(): a Frame, or one line of the text protocol
+    def record(self, arrival_time, item):
+        frame = item if isinstance(item, Frame) else self._stream.add_line(item, arrival_time)
+        if frame is not None:
+            # The reader's times are monotonic
+            self.write(wall_time(arrival_time), frame.samples, frame.heart_rate or 0.0, frame.threshold or 0, frame.seq)
+
+    # Append one packet (timestamp is a wall-clock time), the sequence number defaults to a running count
+    def write(self, timestamp, samples, heart_rate, threshold, seq=None):
+        seq = self.count if seq is None else seq
+        heart_rate = float(np.clip(np.nan_to_num(heart_rate), 0.0, 6553.5))
+        threshold = int(np.clip(threshold, 0, 0xFFFF))
+        self.file.write(TIMESTAMP.pack(timestamp) + encode_frame(seq, samples, heart_rate, threshold))
+        self.file.flush()
+        self.count += 1
+
+    # Close the recording
+    def close(self):
+        self.file.close()
+
+# Offsets of all complete records in a memory-mapped recording, up to the first one without sync bytes
+def record_offsets(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a session recording")
+    offsets = []
+    offset = len(MAGIC)
+    count_at = TIMESTAMP.size + HEADER.size - 1
+    while offset + count_at < len(data):
+        sync_at = offset + TIMESTAMP.size
+        if data[sync_at:sync_at + len(SYNC)] != SYNC:
+            break  # Corrupt or zero-filled, the record lengths after it are unknown
+        end = sync_at + frame_size(data[offset + count_at])
+        if end > len(data):
+            break  # Last record was cut short while being written
+        offsets.append(offset)
+        offset = end
+    return offsets
+
+# Yield (timestamp, Frame) for every valid record of a recording
+def read_session(path):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for offset in record_offsets(data):
+            record = _read_record(data, offset)
+            if record is not None:
+                yield record
+
+# Yield (timestamp, Frame) for the valid records from byte offset start up to end (record
+# boundaries from record_offsets), so a large recording can be split between workers
+def read_records(data, start, end):
+    while start < end:
+        record = _read_record(data, start)
+        if record is not None:
+            yield record
+        start += TIMESTAMP.size + frame_size(data[start + TIMESTAMP.size + HEADER.size - 1])
+
+# Decode the record at a byte offset of a mapped recording, None if it fails the sync or CRC check
+def _read_record(data, offset):
+    timestamp, = TIMESTAMP.unpack_from(data, offset)
+    count = data[offset + TIMESTAMP.size + HEADER.size - 1]
+    start = offset + TIMESTAMP.size
+    try:
+        return timestamp, decode_frame(data[start:start + frame_size(count)])
+    except ValueError:
+        return None
+
+# Serial port stand-in that replays a recording
+#
+# speed=1 replays in real time, speed=N N times faster and speed=None as
+# fast as the reader can take the data. When the recording is finished the
+# port behaves like an idle device: reads time out and `finished` is True.
+class ReplayPort:
+    # Constructor
+    def __init__(self, path, speed=1.0, timeout=0.1):
+        self.path = path
+        self.speed = speed
+        self.timeout = timeout
+        self.finished = False
+        self._file = open(path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = record_offsets(self._data)
+        self._next = 0
+        self._chunk = memoryview(b'')
+        self._start = None
+        self._cancel = threading.Event()
+        self.is_open = True
+
+    # Number of bytes that can be read without waiting
+    @property
+    def in_waiting(self):
+        return len(self._chunk)
+
+    # Read up to size bytes, waiting for the next record if needed
+    def read(self, size=1):
+        if not self._chunk and not self._load_next():
+            return b''
+        data = bytes(self._chunk[:size])
+        self._chunk = self._chunk[size:]
+        return data
+
+    # Read up to and including the next newline
+    def readline(self):
+        line = bytearray()
+        while not line.endswith(b'\n'):
+            data = self.read(1)
+            if not data:
+                break
+            line += data
+        return bytes(line)
+
+    # Wake up a read that is waiting for the next record
+    def cancel_read(self):
+        self._cancel.set()
+
+    # Close the recording
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self._chunk.release()
+            self._data.close()
+            self._file.close()
+
+    # Wait until the next record is due and make its frame readable
+    def _load_next(self):
+        self._cancel.clear()
+        if self._next >= len(self._offsets):
+            self.finished = True
+            self._cancel.wait(self.timeout)
+            return False
+
+        offset = self._offsets[self._next]
+        timestamp, = TIMESTAMP.unpack_from(self._data, offset)
+        if self.speed:
+            now = time.monotonic()
+            if self._start is None:
+                self._start = (now, timestamp)
+            due = self._start[0] + (timestamp - self._start[1]) / self.speed
+            if due > now and self._cancel.wait(min(due - now, self.timeout)):
+                return False
+            if due - time.monotonic() > 0:
+                return False  # Not due yet, behave like a read timeout
+
+        count = self._data[offset + TIMESTAMP.size + HEADER.size - 1]
+        start = offset + TIMESTAMP.size
+        self._chunk = memoryview(self._data)[start:start + frame_size(count)]
+        self._next += 1
+        return True
+
+# Record a synthetic session and time the replay at maximum speed
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    from .serial_reader import SerialReader
+
+    path = os.path.join(tempfile.mkdtemp(), 'session.ppgrec')
+    rng = np.random.default_rng(0)
+    recorder = SessionRecorder(path)
+    for seq in range(600):  # Ten minutes of packets
+        samples = rng.integers(1800, 2100, 50)
+        recorder.record(1000.0 + seq, f"R,{','.join(f'{v:4d}' for v in samples)},")
+        recorder.record(1000.0 + seq, "H,72.000000")
+        recorder.record(1000.0 + seq, "T,1950")
+        recorder.record(1000.0 + seq, f"S,{seq + 1}")
+    recorder.close()
+    assert sum(1 for _ in read_session(path)) == 600
+
+    # A damaged copy: one record with a bad CRC and a zero-filled tail
+    damaged = os.path.join(os.path.dirname(path), 'damaged.ppgrec')
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    data[len(MAGIC) + TIMESTAMP.size + HEADER.size] ^= 0xFF  # First sample of the first record
+    with open(damaged, 'wb') as f:
+        f.write(bytes(data) + bytes(20) + bytes(200))
+    assert sum(1 for _ in read_session(damaged)) == 599
+
+    port = ReplayPort(path, speed=None)
+    reader = SerialReader(port, maxsize=0)  # Unbounded, nothing is dropped
+    start = time.perf_counter()
+    reader.start()
+    received = 0
+    while received < 600:
+        received += len(reader.drain())
+        time.sleep(0.001)
+    seconds = time.perf_counter() - start
+    reader.stop()
+    print(f"Replayed {received} packets in {seconds * 1e3:.1f} ms "
+          f"({received / seconds:.0f} packets/s, {os.path.getsize(path)} bytes)")
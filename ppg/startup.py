@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Startup time benchmark
+#
+# Every target is imported in a fresh interpreter with `-X importtime` and
+# reported as its total import time plus the modules with the highest
+# self time, so a regression can be traced to the import that caused it.
+# Interpreter start-up modules (encodings, site, ...) are left out by
+# subtracting an empty run. "first reading" is the wall time from an
+# empty interpreter to the first Reading out of a Pipeline, which includes
+# any deferred imports the first packet pays for. Run it a few times
+# (--repeat) and keep the best, import times are noisy.
+#
+#   python -m ppg.startup                  table
+#   python -m ppg.startup --json out.json  also write the results for tracking across releases
+TARGETS = [
+    'ppg',
+    'ppg.serial_reader',
+    'ppg.pipeline',
+    'ppg.gui.live_plot',
+    'numpy',
+    'scipy.signal',
+    'matplotlib.pyplot',
+    'matplotlib.backends.backend_tkagg',
+    'PySimpleGUI',
+]
+
+FIRST_READING = (
+    "from ppg.device_simulator import DeviceSimulator\n"
+    "from ppg.pipeline import Pipeline\n"
+    "pipeline = Pipeline()\n"
+    "simulator = DeviceSimulator(speed=None, seed=0)\n"
+    "while not pipeline.feed(simulator.next_packet()):\n"
+    "    pass\n"
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run code in a fresh interpreter with -X importtime, returns [(name, depth, self_us, cumulative_us)] or None
+def _import_rows(code, python=sys.executable):
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+# Import time breakdown of one module: total and the slowest modules by self time
+def measure_import(module, baseline=(), top=5, python=sys.executable):
+    rows = _import_rows(f"import {module}", python)
+    if rows is None:
+        return None
+    rows = [row for row in rows if row[0] not in baseline]
+    total_us = sum(cumulative for _, depth, _, cumulative in rows if depth == 0)
+    slowest = sorted(rows, key=lambda row: row[2], reverse=True)[:top]
+    return {"total_ms": total_us / 1e3, "modules": len(rows),
+            "slowest": [(name, self_us / 1e3) for name, _, self_us, _ in slowest]}
+
+# Wall time of running code in a fresh interpreter, in milliseconds
+def wall_time_ms(code, python=sys.executable):
+    start = time.perf_counter()
+    subprocess.run([python, '-c', code], cwd=ROOT, check=True, capture_output=True)
+    return (time.perf_counter() - start) * 1e3
+
+# Measure every target, keeping the best of `repeat` runs
+def run(targets=TARGETS, repeat=3, top=5, python=sys.executable):
+    baseline = {row[0] for row in _import_rows("pass", python) or []}
+    results = {}
+    for module in targets:
+        runs = [measure_import(module, baseline, top, python) for _ in range(repeat)]
+        runs = [result for result in runs if result is not None]
+        results[module] = min(runs, key=lambda result: result["total_ms"]) if runs else None
+
+    empty = min(wall_time_ms("pass", python) for _ in range(repeat))
+    first = min(wall_time_ms(FIRST_READING, python) for _ in range(repeat))
+    return {"python": sys.version.split()[0], "imports": results, "first_reading_ms": first - empty}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import time breakdown of the ppg package and the GUI stack")
+    parser.add_argument('targets', nargs='*', default=TARGETS, help="modules to import")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per target, the best is kept")
+    parser.add_argument('--top', type=int, default=5, help="slowest modules to list per target")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.targets, args.repeat, args.top)
+    for module, result in results["imports"].items():
+        if result is None:
+            print(f"{module:36s}    not installed")
+            continue
+        print(f"{module:36s} {result['total_ms']:8.1f} ms  ({result['modules']} modules)")
+        for name, self_ms in result["slowest"]:
+            print(f"    {name:48s} {self_ms:8.1f} ms self")
+    print(f"{'first reading':36s} {results['first_reading_ms']:8.1f} ms  (start to first Reading)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
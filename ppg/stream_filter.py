@@ -0,0 +1,49 @@
+import numpy as np
+
+from .filter_bank import FilterBank
+from .filter_design import signal
+
+# Streaming Butterworth low-pass filter
+#
+# A one-stage FilterBank, so the design (in second-order-section form)
+# comes from the filter_design cache and creating a filter does not
+# import scipy. The sosfilt state is carried over between packets, so
+# each call only costs as much as the new samples it is given. With
+# lag > 0 the filter runs forward-backward over a fixed window and
+# returns zero-phase output delayed by `lag` samples, which is what the
+# plots use.
+class StreamingLPF:
+    # Constructor
+    def __init__(self, cutoff, fs, order=5, lag=0):
+        self.cutoff = cutoff
+        self.fs = fs
+        self.order = order
+        self.lag = lag
+        self.bank = FilterBank(fs).lowpass(cutoff, order)
+        self.sos = self.bank.sos
+        self._padlen = 3 * (2 * len(self.sos) + 1)
+        self.reset()
+
+    # Forget the filter state (e.g. after a reconnect)
+    def reset(self):
+        self.bank.reset()
+        self._history = None
+
+    # Filter the new samples only and return the same number of outputs
+    def process(self, samples):
+        x = np.asarray(samples, dtype=float)
+        if x.size == 0:
+            return x
+        if self.lag > 0:
+            return self._process_zero_phase(x)
+        return self.bank.process(x)
+
+    # Fixed-lag zero-phase filtering over a window of constant length
+    def _process_zero_phase(self, x):
+        if self._history is None:
+            self._history = np.full(2 * self.lag, x[0])
+        window = np.concatenate((self._history, x))
+        self._history = window[-2 * self.lag:]
+        y = signal.sosfiltfilt(self.sos, window, padlen=min(window.size - 1, self._padlen))
+        end = window.size - self.lag
+        return y[end - x.size:end]
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+
+from .timestamps import monotonic
+
+# Alarm threshold settings
+#
+# Each threshold is shown as a slider and an input box. Instead of reading
+# both and updating the sliders on every loop tick, the main loop passes
+# each event to handle(), which only acts on events from those elements:
+# the new value is validated (a whole number within the slider range, low
+# below high), copied to the other element of the pair, pushed to the
+# listeners (e.g. AlarmEngine.set_limits) and saved to a JSON file that is
+# loaded again at the next startup. An invalid entry is shown in red and
+# is not applied until it is corrected; an invalid slider position snaps
+# back. The elements need enable_events=True.
+#
+# A slider drag sends an event per step, so the file is only written once
+# the values have not changed for SAVE_DELAY seconds (checked by handle()
+# on every loop pass) and by close(). A failed write is logged and the
+# GUI carries on with the new values.
+class ThresholdSettings:
+    KEYS = {"high": ('-HIGH-THRESH-', '-HIGH-INPUT-'), "low": ('-LOW-THRESH-', '-LOW-INPUT-')}
+    SAVE_DELAY = 1.0
+
+    # Constructor, loads the saved settings from path if there are any
+    def __init__(self, path=None, low=60, high=100, minimum=50, maximum=150):
+        self.path = path
+        self.minimum = minimum
+        self.maximum = maximum
+        self.low = low
+        self.high = high
+        self.window = None
+        self.listeners = []
+        self._changed_at = None  # Time of the first change not saved yet
+        self.load()
+
+    # Load the saved thresholds, keeping the defaults if the file is missing or invalid
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+            low, high = int(saved["low"]), int(saved["high"])
+        except (OSError, ValueError, TypeError, KeyError):
+            return False
+        if not self.minimum <= low < high <= self.maximum:
+            return False
+        self.low, self.high = low, high
+        return True
+
+    # Save the thresholds (written to a temporary file first so a crash never leaves half a file)
+    def save(self):
+        self._changed_at = None
+        if not self.path:
+            return True
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"low": self.low, "high": self.high}, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.getLogger(__name__).warning("Could not save the thresholds to %s: %s", self.path, e)
+            return False
+        return True
+
+    # Save any unsaved change (call when the window closes)
+    def close(self):
+        if self._changed_at is not None:
+            self.save()
+
+    # Call callback(low, high) now and on every change
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+        callback(self.low, self.high)
+
+    # Show the current thresholds in the window's sliders and input boxes
+    def bind(self, window):
+        self.window = window
+        for name, (slider, entry) in self.KEYS.items():
+            value = getattr(self, name)
+            window[slider].update(value)
+            window[entry].update(str(value), text_color='black')
+
+    # Handle a window event, returns True if it was one of the threshold elements
+    def handle(self, event, values):
+        if self._changed_at is not None and monotonic() - self._changed_at >= self.SAVE_DELAY:
+            self.save()
+        for name, (slider, entry) in self.KEYS.items():
+            if event == slider:
+                value = self.validate(name, round(values[slider]))
+                if value is None:
+                    self.window[slider].update(getattr(self, name))  # Snap back
+                else:
+                    self.window[entry].update(str(value), text_color='black')
+                    self.set(name, value)
+                return True
+            if event == entry:
+                try:
+                    value = self.validate(name, int(values[entry]))
+                except ValueError:
+                    value = None
+                if value is None:
+                    self.window[entry].update(text_color='red')
+                else:
+                    self.window[entry].update(text_color='black')
+                    self.window[slider].update(value)
+                    self.set(name, value)
+                return True
+        return False
+
+    # The value if it is a valid setting for the named threshold, else None
+    def validate(self, name, value):
+        if not self.minimum <= value <= self.maximum:
+            return None
+        if (name == "low" and value >= self.high) or (name == "high" and value <= self.low):
+            return None
+        return value
+
+    # Change a threshold, notifying the listeners; the change is saved once the values settle
+    def set(self, name, value):
+        if getattr(self, name) == value:
+            return
+        setattr(self, name, value)
+        for callback in self.listeners:
+            callback(self.low, self.high)
+        self._changed_at = monotonic()
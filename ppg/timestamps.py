@@ -0,0 +1,55 @@
+import time
+
+# Shared timestamp service
+#
+# Packet arrival and every "how long since" check use monotonic(), which
+# never jumps when the wall clock is changed (NTP, daylight saving, a user
+# fixing the clock). wall_time() converts a monotonic time to seconds since
+# the epoch for display and recordings, using an offset taken at startup.
+#
+# format_timestamp() gives the log's "%a %b %d %H:%M:%S %Y" string. The
+# format has second resolution, so the string is only rebuilt when the
+# second changes and every other call returns the cached one.
+TIME_FORMAT = '%a %b %d %H:%M:%S %Y'
+
+monotonic = time.monotonic
+
+_wall_offset = time.time() - time.monotonic()
+
+# Seconds since the epoch for a monotonic time (now if not given)
+def wall_time(mono=None):
+    return (time.monotonic() if mono is None else mono) + _wall_offset
+
+# Formats a wall-clock time, reusing the string while the second is unchanged
+class TimestampFormatter:
+    # Constructor
+    def __init__(self, fmt=TIME_FORMAT):
+        self.fmt = fmt
+        self._cached = (None, "")
+
+    # Formatted wall time (now if not given)
+    def __call__(self, when=None):
+        second = int(time.time() if when is None else when)
+        cached_second, text = self._cached
+        if second != cached_second:
+            text = time.strftime(self.fmt, time.localtime(second))
+            self._cached = (second, text)  # One assignment, safe to read from other threads
+        return text
+
+format_timestamp = TimestampFormatter()
+
+# Compare the cached formatter with formatting on every call
+if __name__ == '__main__':
+    import timeit
+    from datetime import datetime
+
+    assert format_timestamp(0) == time.strftime(TIME_FORMAT, time.localtime(0))
+    runs = 100000
+    for name, func in [
+        ("datetime.now().strftime", lambda: datetime.now().strftime(TIME_FORMAT)),
+        ("time.strftime", lambda: time.strftime(TIME_FORMAT)),
+        ("format_timestamp", format_timestamp),
+        ("monotonic", monotonic),
+    ]:
+        seconds = timeit.timeit(func, number=runs)
+        print(f"{name:24s} {seconds / runs * 1e6:6.2f} us per call")
@@ -1,53 +1,44 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import scipy.signal
+from ppg.filter_bank import FilterBank
 
 # Butterworth Low Pass Filter Class
+#
+# A one-stage ppg FilterBank: the design is made once (and cached across
+# runs) in second-order sections, which stay accurate at order 6 where
+# the (b, a) form loses precision.
 class Filtering_LPF:
     # Class variables
     order = 6  # Butterworth filter order
     
     # Constructor
     def __init__(self, frequency, sampling_rate):
-        print('new LPF Created')
         self.cutoff = frequency
         self.fs = sampling_rate
+        self.bank = FilterBank(sampling_rate).lowpass(frequency, self.order)
 
-    # Destructor
-    def __del__(self):
-        print("LPF deleted")
-
-    # Butterworth filter function
+    # Butterworth filter coefficients in second-order sections
     def butter_lowpass(self):
-        # Get the Nyquist frequency
-        nyq = 0.5 * self.fs
-        # Normalize cutoff frequency
-        normal_cutoff = self.cutoff / nyq
-        # Get Butterworth filter parameters
-        b, a = scipy.signal.butter(self.order, normal_cutoff, btype='low', analog=False)
-        return b, a
+        return self.bank.sos
 
     # Butterworth filtering function
     def butter_filter(self, data):
-        b, a = self.butter_lowpass()
-        # Apply the filter to the data
-        y = scipy.signal.lfilter(b, a, data)
-        return y
+        # Apply the filter to the data, starting from rest
+        return self.bank.filter(data)
 
-# FFT-based Low Pass Filter Function
+# FFT-based Low Pass Filter Function (whole array at once, see ppg.fft_filter for streams)
 def fft_filter(data, cutoff_freq, sampling_rate):
     # Get relative cutoff freq index
     cutoff_index = int(cutoff_freq * len(data) / sampling_rate)
     
-    # FFT transform to frequency domain
-    F = np.fft.fft(data)
-    F_freq = np.fft.fftfreq(len(data), 1 / sampling_rate)
+    # Real FFT transform to frequency domain (the data is real, so only the positive frequencies)
+    F = np.fft.rfft(data)
     
     # Apply the filter by setting the frequencies above cutoff to 0
-    F[cutoff_index + 1 : -cutoff_index] = 0
+    F[cutoff_index + 1:] = 0
     
     # Transform back to time domain
-    filtered_data = np.fft.ifft(F).real
+    filtered_data = np.fft.irfft(F, len(data))
     
     return filtered_data
 
@@ -1,30 +1,57 @@
-import PySimpleGUI as sg
 import serial
-import time
-from datetime import datetime
 import numpy as np
-from scipy.signal import butter, filtfilt
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-# Initialize packet sequence number and serial communication
-packet_sequence_number = 0
-last_sequence_number = -1
+from ppg.device_simulator import DeviceSimulator
+from ppg.lazy import preload
+from ppg.pipeline import Pipeline
+from ppg.ring_buffer import RingBuffer
+from ppg.serial_reader import SerialReader
+from ppg.session_recorder import ReplayPort, SessionRecorder
+from ppg.threshold_settings import ThresholdSettings
+from ppg.timestamps import monotonic
+
+# Record every packet to a file, or replay a recording instead of the device
+RECORD_FILE = None  # e.g. "session.ppgrec"
+REPLAY_FILE = None  # e.g. "session.ppgrec"
+REPLAY_SPEED = 1.0  # 1.0 = real time, N = N times faster, None = as fast as possible
+SIMULATE_DEVICE = False  # Run against device_simulator instead of the board
+LOG_FILE = "ppg_monitor.log"  # Every log entry is also written here (rotated at 5 MB)
+SETTINGS_FILE = "ppg_settings.json"  # Alarm thresholds, saved once a change settles
 
 # Initialize serial connection (adjust COM port and baud rate)
-ser = serial.Serial('COM5', 115200, timeout=100)  # Replace 'COM5' with your port
-
-# Function to apply Butterworth low-pass filter
-def butter_lowpass_filter(data, cutoff, fs, order=5):
-    nyquist = 0.5 * fs
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    y = filtfilt(b, a, data)
-    return y
+if REPLAY_FILE:
+    ser = ReplayPort(REPLAY_FILE, speed=REPLAY_SPEED)
+elif SIMULATE_DEVICE:
+    ser = DeviceSimulator().open_loop()
+else:
+    ser = serial.Serial('COM5', 115200, timeout=100)  # Replace 'COM5' with your port
+
+# Read the port on a background thread so the GUI never blocks on it
+# (unbounded when replaying at full speed so no packet is dropped)
+reader = SerialReader(ser, maxsize=0 if REPLAY_FILE and not REPLAY_SPEED else 1000)
+reader.start()
+recorder = SessionRecorder(RECORD_FILE) if RECORD_FILE else None
+
+# The GUI toolkit and matplotlib take a while to import, so they are only
+# loaded once the port is already being read in the background
+import PySimpleGUI as sg
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from ppg.gui.alarm_indicator import AlarmIndicator
+from ppg.gui.live_plot import LivePlot
+from ppg.gui.log_panel import LogPanel
+from ppg.gui.render_scheduler import RenderScheduler
 
 fs = 50  # Sampling frequency in Hz (adjust as needed)
 cutoff = 2.5  # Desired cutoff frequency in Hz
 
+# Packets -> low-pass filter -> heart rate -> alarm, the GUI only displays the readings
+pipeline = Pipeline(fs, cutoff, recorder=recorder)
+sequence = pipeline.sequence  # Loss, reordering, duplicates and device resets
+
+# Alarm thresholds, pushed to the pipeline's alarm engine on every change
+settings = ThresholdSettings(SETTINGS_FILE)
+settings.subscribe(pipeline.alarm.set_limits)
+
 # Add this text at the beginning of your code
 info_text = (
     "A Photoplethysmography (PPG) sensor measures blood volume changes in \n\n"
@@ -46,6 +73,12 @@ def draw_figure(canvas, figure):
     figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
     return figure_canvas_agg
 
+# Function to show a figure canvas that has already been created
+def show_figure(figure_canvas_agg):
+    figure_canvas_agg.get_tk_widget().pack(side='top', fill='both', expand=1)
+    figure_canvas_agg.draw()
+    return figure_canvas_agg
+
 # Create the initial Matplotlib figures
 def create_plots():
     fig1, ax1 = plt.subplots(figsize=(15, 12))  # PPG signal plot
@@ -58,27 +91,17 @@ def create_plots():
 
     return (fig1, ax1), (fig2, ax2)
 
-# Function to draw the alarm LEDs
-def draw_alarm(canvas, state):
-    canvas.delete("all")
-    colors = {"high": "red", "normal": "green", "low": "blue"}
-    positions = {"high": (50, 50), "normal": (150, 50), "low": (250, 50)}
-    for key, pos in positions.items():
-        color = colors[key] if state == key else "grey"
-        canvas.create_oval(pos[0] - 20, pos[1] - 20, pos[0] + 20, pos[1] + 20, fill=color)
-        canvas.create_text(pos[0], pos[1] + 30, text=key.capitalize(), font=("Helvetica", 12))
-    canvas.create_text(150, 10, text="ALARMS", font=("Helvetica", 16))
-
 # Layout for the GUI
 layout = [
     [sg.Text("Pulse Rate: "), sg.Text("0", key='-BPM-', font=("Helvetica", 50), size=(10, 1))],
     [sg.Canvas(key='-CANVAS-', size=(1200, 800)),
      sg.Column([
          [sg.Canvas(key='-ALARM-', size=(300, 150))],
-         [sg.Text("High Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(40, 20), default_value=100, key='-HIGH-THRESH-'), sg.InputText('100', size=(5, 1), key='-HIGH-INPUT-')],
-         [sg.Text("Low Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(40, 20), default_value=60, key='-LOW-THRESH-'), sg.InputText('60', size=(5, 1), key='-LOW-INPUT-')],
+         [sg.Text("High Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(40, 20), default_value=100, key='-HIGH-THRESH-', enable_events=True), sg.InputText('100', size=(5, 1), key='-HIGH-INPUT-', enable_events=True)],
+         [sg.Text("Low Pulse Threshold"), sg.Slider(range=(50, 150), orientation='h', size=(40, 20), default_value=60, key='-LOW-THRESH-', enable_events=True), sg.InputText('60', size=(5, 1), key='-LOW-INPUT-', enable_events=True)],
          [sg.Button("Info"), sg.Button("PPG signal"), sg.Button("Heart rate (bpm)")]
      ])],
+    [sg.Text(sequence.status(), key='-SEQ-', font=("Helvetica", 12))],
     [sg.Multiline(size=(100, 10), key='-LOG-', disabled=True, font=("Helvetica", 16))],
     [sg.Button("Exit", font=("Helvetica", 16))]
 ]
@@ -86,32 +109,118 @@ layout = [
 # Create the window
 window = sg.Window("PPG Monitor", layout, finalize=True, resizable=True)
 
+# scipy is only needed once samples are filtered, import it while the window is idle
+preload('scipy.signal')
+
+# Log entries are batched into the Multiline once per frame, which keeps the last 500 lines
+log_panel = LogPanel(window['-LOG-'], file_path=LOG_FILE)
+
 # Draw the initial plots
 (fig1, ax1), (fig2, ax2) = create_plots()
-canvas = draw_figure(window['-CANVAS-'].TKCanvas, fig1)
+canvas1 = draw_figure(window['-CANVAS-'].TKCanvas, fig1)
+canvas2 = draw_figure(window['-CANVAS-'].TKCanvas, fig2)
+canvas2.get_tk_widget().pack_forget()
+canvas = canvas1
+
+# Create the plot lines once, they are updated in place and blitted
+pulse_plot = LivePlot(canvas1, ax1)
+pulse_plot.add_line("raw", label="Raw Pulse Data", alpha=0.5)
+pulse_plot.add_line("filtered", label="Filtered Pulse Data", linestyle='--', color='blue')
+pulse_plot.add_hline("threshold", color='r', linestyle='--', label="Threshold")
+pulse_plot.legend()
+
+hr_plot = LivePlot(canvas2, ax2, xmargin=0.5)
+hr_plot.add_line("heart_rate", label="Heart Rate")
+hr_plot.legend()
+
+# Redraw functions for the plot views, called by the render scheduler
+def redraw_pulse():
+    pulse_plot.set_data("raw", pulse_data.latest())
+    pulse_plot.set_data("filtered", filtered_pulse_data.latest())
+    if adp_threshold is not None:
+        pulse_plot.set_hline("threshold", adp_threshold)
+    pulse_plot.update()
+
+def redraw_heart_rate():
+    hr_plot.set_data("heart_rate", heart_rate_data.latest(), x=time_data.latest())
+    hr_plot.update()
+
+# Packets only mark views dirty, the visible view is redrawn at most once per frame
+renderer = RenderScheduler(fps=20)
+renderer.add_view("pulse", redraw_pulse)
+renderer.add_view("heart_rate", redraw_heart_rate)
+renderer.show("pulse")
 
 # Draw the initial alarm state
-alarm_canvas = window['-ALARM-'].TKCanvas
-draw_alarm(alarm_canvas, "normal")
+alarm = AlarmIndicator(window['-ALARM-'].TKCanvas)
+
+# Show the saved thresholds in the sliders and input boxes
+settings.bind(window)
 
-pulse_data = []
-filtered_pulse_data = []
-heart_rate_data = []
-time_data = []
+# Fixed-size sample buffers (pulse: last 250 samples, heart rate: last 10 readings)
+pulse_data = RingBuffer(250)
+filtered_pulse_data = RingBuffer(250)
+heart_rate_data = RingBuffer(10)
+time_data = RingBuffer(10)
 t = 0
 
 # Set update frequency to 1 second
-last_update_time = time.time()
-last_packet_time = time.time()
-last_log_time = time.time()  # Initialize the last log update time
+last_update_time = monotonic()
+last_packet_time = monotonic()
+last_log_time = monotonic()  # Initialize the last log update time
+dropped_lines = 0
 
 # Initialize heart_rate to None before the main loop
 heart_rate = None
 adp_threshold = None  # Initialize adp_threshold to None
 
+# Handlers for the pipeline's output, one Reading per packet
+def on_reading(reading):
+    global adp_threshold
+    pulse_data.extend(reading.samples)
+    filtered_pulse_data.extend(reading.filtered)
+    if reading.threshold is not None:
+        adp_threshold = reading.threshold
+
+    # Plot the pulse data on the next frame
+    renderer.mark_dirty("pulse")
+
+    if reading.heart_rate is not None:
+        on_heart_rate(reading.heart_rate)
+    on_alarm_state(reading.alarm)
+    on_sequence(reading.seq, reading.sequence_event)
+
+def on_heart_rate(value):
+    global heart_rate, t
+    heart_rate = value
+    t += 1
+    time_data.append(t)
+    heart_rate_data.append(heart_rate)
+    window['-BPM-'].update(f"{heart_rate:.1f} BPM")
+
+    # Plot heart rate data on the next frame
+    renderer.mark_dirty("heart_rate")
+
+def on_alarm_state(state):
+    # Redraw and log only when the alarm state changes
+    if state is not None:
+        alarm.set_state(state)
+        log_panel.log(f"Pulse {state.capitalize()}, Sequence: {sequence.head}")
+
+def on_sequence(number, event):
+    if number is None:
+        return
+
+    # Only losses and device resets are logged, the status line shows the rest
+    if event == "gap":
+        log_panel.warning(f"Packets lost before sequence {number} ({sequence.lost} lost in total)")
+    elif event == "reset":
+        log_panel.warning(f"Device restarted, sequence reset to {number}")
+    window['-SEQ-'].update(sequence.status())
+
 # Main loop
 while True:
-    event, values = window.read(timeout=100)
+    event, values = window.read(timeout=renderer.timeout_ms())
 
     if event == sg.WIN_CLOSED or event == 'Exit':
         break
@@ -119,14 +228,17 @@ while True:
     # Handle graph switching buttons
     if event == 'PPG signal':
         canvas.get_tk_widget().pack_forget()
-        canvas = draw_figure(window['-CANVAS-'].TKCanvas, fig1)
-        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Display PPG signal")
+        canvas = show_figure(canvas1)
+        renderer.show("pulse")
+        log_panel.log("Display PPG signal")
     elif event == 'Heart rate (bpm)':
         canvas.get_tk_widget().pack_forget()
-        canvas = draw_figure(window['-CANVAS-'].TKCanvas, fig2)
-        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Display heart rate (bpm)")
+        canvas = show_figure(canvas2)
+        renderer.show("heart_rate")
+        log_panel.log("Display heart rate (bpm)")
     elif event == 'Info':
         canvas.get_tk_widget().pack_forget()
+        renderer.show()
         window['-CANVAS-'].TKCanvas.create_rectangle(0, 0, window['-CANVAS-'].TKCanvas.winfo_width(), window['-CANVAS-'].TKCanvas.winfo_height(), fill="white")
         window['-CANVAS-'].TKCanvas.create_text(
             window['-CANVAS-'].TKCanvas.winfo_width() // 2,
@@ -137,108 +249,42 @@ while True:
             anchor='center',
             justify='left'
         )
-        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Display Info")
-
-    # Update threshold values from input fields and handle empty input gracefully
-    try:
-        high_threshold = int(values['-HIGH-INPUT-']) if values['-HIGH-INPUT-'] else int(values['-HIGH-THRESH-'])
-        low_threshold = int(values['-LOW-INPUT-']) if values['-LOW-INPUT-'] else int(values['-LOW-THRESH-'])
-        window['-HIGH-THRESH-'].update(high_threshold)
-        window['-LOW-THRESH-'].update(low_threshold)
-    except ValueError:
-        pass
-
-    # Read data from serial
-    if ser.in_waiting > 0:
-        line = ser.readline().decode('utf-8').strip()  # Read serial data
-        last_packet_time = time.time()  # Update last packet time
-
-        # Process the received line
-        if line:
-            try:
-                if line.startswith("R,"):  # Raw pulse data
-                    pulse_values = [int(val.strip()) for val in line[2:].split(",")]
-                    pulse_data.extend(pulse_values)
-
-                    # Apply low-pass filter
-                    filtered_pulse_data = butter_lowpass_filter(pulse_data, cutoff, fs)
-
-                    # Keep the pulse data at a manageable size (last 250 samples)
-                    if len(pulse_data) > 250:
-                        pulse_data = pulse_data[-250:]
-                        filtered_pulse_data = filtered_pulse_data[-250:]
-
-                    # Plot the pulse data
-                    ax1.clear()
-                    ax1.plot(pulse_data, label="Raw Pulse Data", alpha=0.5)
-                    ax1.plot(filtered_pulse_data, label="Filtered Pulse Data", linestyle='--', color='blue')
-                    if adp_threshold is not None:
-                        ax1.axhline(y=adp_threshold, color='r', linestyle='--', label="Threshold")
-                    ax1.legend()
-                    canvas.draw()
-
-                elif line.startswith("H,"):  # Heart rate data
-                    heart_rate = float(line[2:])
-                    if heart_rate <= 120:  # Ignore readings above 120 BPM
-                        heart_rate_data.append(heart_rate)
-                        window['-BPM-'].update(f"{heart_rate:.1f} BPM")
-
-                    # Manage x-axis sliding window for heart rate data
-                    if len(time_data) > 10:
-                        time_data = time_data[-10:]
-                        heart_rate_data = heart_rate_data[-10:]
-
-                    # Plot heart rate data
-                    ax2.clear()
-                    ax2.plot(time_data, heart_rate_data, label="Heart Rate")
-                    ax2.legend()
-                    canvas.draw()
-
-                elif line.startswith("T,"):  # Adaptive threshold
-                    adp_threshold = int(line[2:])
-
-                elif line.startswith("S,"):  # Sequence number
-                    packet_sequence_number = int(line[2:])
-                    if packet_sequence_number != last_sequence_number + 1:
-                        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Packet out of order! Sequence: {packet_sequence_number}")
-                    else:
-                        window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Packet received. Sequence: {packet_sequence_number}")
-                    last_sequence_number = packet_sequence_number
-
-                # Update time data
-                t += 1
-                time_data.append(t)
-
-                # Log only once per second
-                current_time = time.time()
-                if current_time - last_log_time >= 0.8:
-                    if heart_rate is not None:
-                        timestamp = datetime.now().strftime("%a %b %d %H:%M:%S %Y")
-                        if heart_rate > high_threshold:
-                            log_message = f"{timestamp}: Pulse High, Sequence: {packet_sequence_number}"
-                            draw_alarm(alarm_canvas, "high")
-                        elif heart_rate < low_threshold:
-                            log_message = f"{timestamp}: Pulse Low, Sequence: {packet_sequence_number}"
-                            draw_alarm(alarm_canvas, "low")
-                        else:
-                            log_message = f"{timestamp}: Pulse Normal, Sequence: {packet_sequence_number}"
-                            draw_alarm(alarm_canvas, "normal")
-
-                        window['-LOG-'].print(log_message)
-                        last_log_time = current_time
-
-            except ValueError:
-                pass
+        log_panel.log("Display Info")
+
+    # Threshold sliders and input boxes (validated, pushed to the alarm engine and saved)
+    settings.handle(event, values)
+
+    # Process every line the reader thread has received since the last tick
+    lines = reader.drain()
+    for reading in pipeline.process_items(lines):
+        on_reading(reading)
+    if lines:
+        last_packet_time = lines[-1][0]
+
+    # Report lines the reader had to drop because the GUI fell behind
+    if reader.dropped != dropped_lines:
+        log_panel.warning(f"Dropped {reader.dropped - dropped_lines} serial lines (GUI too slow)")
+        dropped_lines = reader.dropped
 
     # Check for packet loss (if 5 seconds have passed since the last packet)
-    elif time.time() - last_packet_time > 5:
-        if time.time() - last_log_time > 1:  # Log only once per second
-            window['-LOG-'].print(f"{datetime.now().strftime('%a %b %d %H:%M:%S %Y')}: Packet not received for 5 seconds!")
-            last_log_time = time.time()
+    if not lines and monotonic() - last_packet_time > 5:
+        if monotonic() - last_log_time > 1:  # Log only once per second
+            log_panel.warning("Packet not received for 5 seconds!")
+            last_log_time = monotonic()
+
+    # Redraw the visible plot if it changed and a frame is due
+    renderer.tick()
+    log_panel.flush()
 
     # Keep the GUI responsive
     window.refresh()
 
 # Close serial and GUI on exit
+reader.stop()
 ser.close()
+if recorder is not None:
+    recorder.close()
+log_panel.close()
+alarm.close()
+settings.close()
 window.close()